@@ -0,0 +1,74 @@
+# Startup cost of the entry points, each imported in a fresh interpreter.
+#
+#   python benchmarks/bench_import.py [--runs 5]
+#
+# Fails (exit code 1) when krossy_cli pulls in a heavy dependency at import
+# time or takes longer than its budget, so startup regressions get caught.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY = ['pandas', 'numpy', 'httpx', 'bs4', 'lxml', 'prefect', 'scrapy', 'pyarrow']
+# module -> budget in seconds (None: measured only)
+MODULES = {
+    'krossy_cli': 0.05,
+    'krossy': None,
+    'krossy_prefect': None,
+}
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"s": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure(module: str, runs: int) -> dict:
+    times, heavy = [], []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode:
+            return {'error': proc.stderr.strip().splitlines()[-1:]}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(result['s'])
+        heavy = result['heavy']
+    # the minimum is the least noisy estimate of the cost itself
+    return {'min_s': min(times), 'max_s': max(times), 'heavy': heavy}
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument('--runs', type=int, default=5)
+    args = args.parse_args()
+
+    failed = False
+    for module, budget in MODULES.items():
+        result = measure(module, args.runs)
+        if 'error' in result:
+            print(f'{module:>15}: import failed: {result["error"]}')
+            failed = failed or budget is not None
+            continue
+        status = ''
+        if budget is not None:
+            if result['heavy']:
+                status, failed = f'FAIL imports {", ".join(result["heavy"])}', True
+            elif result['min_s'] > budget:
+                status, failed = f'FAIL over {budget * 1000:.0f}ms budget', True
+            else:
+                status = 'ok'
+        print(f'{module:>15}: {result["min_s"] * 1000:7.1f}ms (max {result["max_s"] * 1000:.1f}ms) {status}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
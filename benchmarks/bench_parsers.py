@@ -0,0 +1,113 @@
+# Parse + extract throughput of the ExtractItems parser backends on saved pages.
+#
+#   python benchmarks/bench_parsers.py [pages_dir] [--repeat N] [--embedded]
+#
+# pages_dir holds catalog pages saved as *.html; without it a synthetic
+# megasport-like page is generated, with --embedded carrying its products as
+# JSON-LD too. The 'embedded' row is the spec in embedded mode: JSON-LD rows
+# when they match the grid, else the lxml fallback, whose cost it includes.
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from krossy import ExtractBootsMaleItems
+from krossy_parsers import LxmlParser, SoupParser, StrainedSoupParser
+
+
+BACKENDS = {
+    'html.parser': SoupParser(),
+    'soup+lxml': SoupParser('lxml'),
+    'strained': StrainedSoupParser(classes=['Fkfp3V'], ids=['select-page']),
+    'lxml': LxmlParser(),
+}
+
+
+def jsonld(items: int, seed: int) -> str:
+    products = [{
+        '@type': 'ListItem', 'position': i + 1,
+        'item': {
+            '@type': 'Product', 'name': f'Кросівки\xa0{n}', 'url': f'/ua/products/{n}/',
+            'offers': {'@type': 'Offer', 'price': f'{n}999.00', 'priceCurrency': 'UAH'},
+        },
+    } for i, n in enumerate(range(seed * items, seed * items + items))]
+    data = {'@context': 'https://schema.org', '@type': 'ItemList', 'itemListElement': products}
+    return f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+
+def synthetic_page(items: int = 60, pages: int = 39, seed: int = 0, embedded: bool = False) -> str:
+    item = (
+        '<div class="Z7K92d"><a class="it25hX" href="/ua/products/{i}/">'
+        '<img src="/img/{i}.jpg" alt=""><div class="ihuxuw">Кросівки\xa0{i}</div></a>'
+        '<div class="x1"><span class="MeSmTt">{i}\xa0999\u2009грн</span></div></div>'
+    )
+    noise = ''.join(f'<li class="nav"><a href="/ua/c/{i}/">Категорія {i}</a></li>' for i in range(400))
+    grid = ''.join(item.format(i=seed * items + i) for i in range(items))
+    options = ''.join(f'<option value="{i}">{i}</option>' for i in range(1, pages + 1))
+    return (
+        f'<html><head><title>catalog</title>{jsonld(items, seed) if embedded else ""}</head><body><ul>{noise}</ul>'
+        f'<select id="select-page">{options}</select><div class="Fkfp3V">{grid}</div>'
+        f'<footer><ul>{noise}</ul></footer></body></html>'
+    )
+
+
+def load_pages(pages_dir: str, embedded: bool = False):
+    if not pages_dir:
+        return [synthetic_page(embedded=embedded)]
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def bench(parser, pages, repeat: int):
+    extractor = ExtractBootsMaleItems(client=None, host='https://megasport.ua', path='/', parser=parser)
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for txt in pages:
+            doc = parser.parse(txt)
+            for item in extractor._get_items(doc):
+                extractor._get_row(item)
+                rows += 1
+            parser.release(doc)
+    elapsed = time.perf_counter() - start
+    return len(pages) * repeat / elapsed, rows / elapsed
+
+
+def bench_embedded(pages, repeat: int):
+    spec = ExtractBootsMaleItems.spec
+    bodies = [txt.encode('utf-8') for txt in pages]
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            rows += len(spec.rows_from_body(body, embedded=True))
+    elapsed = time.perf_counter() - start
+    return len(pages) * repeat / elapsed, rows / elapsed
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument('pages_dir', nargs='?')
+    args.add_argument('--repeat', type=int, default=20)
+    args.add_argument('--embedded', action='store_true', help='add JSON-LD to the synthetic page')
+    args = args.parse_args()
+
+    pages = load_pages(args.pages_dir, args.embedded)
+    print(f"{len(pages)} page(s) x {args.repeat}")
+    print(f"{'backend':>12} {'pages/s':>10} {'items/s':>10}")
+    for name, parser in BACKENDS.items():
+        pages_s, items_s = bench(parser, pages, args.repeat)
+        print(f"{name:>12} {pages_s:>10.1f} {items_s:>10.0f}")
+    pages_s, items_s = bench_embedded(pages, args.repeat)
+    print(f"{'embedded':>12} {pages_s:>10.1f} {items_s:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Row accumulation: per-item pd.concat vs RowBuffer.
+#
+#   python benchmarks/bench_rows.py [sizes...]
+#
+# pd.concat is quadratic, so it is only measured up to CONCAT_LIMIT items.
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from krossy_rows import RowBuffer
+
+
+COLUMNS = ["name", "price_ua", "link"]
+SIZES = [10_000, 100_000, 1_000_000]
+CONCAT_LIMIT = 10_000
+
+
+def rows(n: int):
+    for i in range(n):
+        yield {
+            "name": f"Кросівки {i}",
+            "price_ua": None if i % 97 == 0 else 1000 + i % 9000,
+            "link": f"https://megasport.ua/ua/products/{i}/",
+        }
+
+
+def bench_concat(n: int) -> float:
+    start = time.perf_counter()
+    df = pd.DataFrame(columns=COLUMNS)
+    for res in rows(n):
+        df = pd.concat([df, pd.DataFrame([res])])
+    return time.perf_counter() - start
+
+
+def bench_buffer(n: int) -> float:
+    start = time.perf_counter()
+    buffer = RowBuffer(COLUMNS, int_columns=('price_ua',))
+    buffer.extend(rows(n))
+    buffer.to_dataframe()
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'items':>10} {'pd.concat, s':>14} {'RowBuffer, s':>14}")
+    for n in sizes:
+        concat = f"{bench_concat(n):.3f}" if n <= CONCAT_LIMIT else "-"
+        print(f"{n:>10} {concat:>14} {bench_buffer(n):>14.3f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
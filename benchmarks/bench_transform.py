@@ -0,0 +1,57 @@
+# Transform: per-row .apply on object columns vs the vectorized, typed Transform.
+#
+#   python benchmarks/bench_transform.py [rows]
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from krossy import Transform
+
+
+def raw_frame(n: int) -> pd.DataFrame:
+    prices = np.random.default_rng(0).integers(1000, 20000, n)
+    return pd.DataFrame({
+        "name": [f"Кросівки {i % 5000}" for i in range(n)],
+        "price_ua": pd.Series(prices, dtype=object),
+        "link": [f"https://megasport.ua/ua/products/{i}/" for i in range(n)],
+    })
+
+
+def legacy(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.dropna(inplace=True)
+    df.loc[:, 'price_us'] = df.loc[:, 'price_ua'].apply(lambda x: round(x / 35, 2))
+    df.loc[:, 'date'] = datetime.now()
+    return df
+
+
+def measure(fn, df):
+    start = time.perf_counter()
+    out = fn(df)
+    elapsed = time.perf_counter() - start
+    # tracemalloc slows allocations down, so memory is measured on a second run
+    tracemalloc.start()
+    fn(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, out.memory_usage(deep=True).sum()
+
+
+def main(n: int):
+    df = raw_frame(n)
+    print(f"{n} rows")
+    print(f"{'':>12} {'time, s':>10} {'peak, MB':>10} {'result, MB':>11}")
+    for name, fn in (('legacy', legacy), ('vectorized', Transform().transform_batch)):
+        elapsed, peak, size = measure(fn, df)
+        print(f"{name:>12} {elapsed:>10.3f} {peak / 2**20:>10.1f} {size / 2**20:>11.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,137 @@
+# Local stand-in for the catalog site: serves recorded pages with configurable
+# latency and error rate, and records per-request timings and bytes.
+#
+#   python benchmarks/mock_server.py [--fixtures DIR | --synthetic-pages N] [--port 8765]
+#                                    [--latency-ms 20] [--jitter-ms 10] [--error-rate 0.01]
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_parsers import synthetic_page
+
+
+CATALOG_PATH = '/ua/catalog/krossovki-i-snikersi/male/'
+
+
+def write_synthetic_catalog(out: str, pages: int, path: str = CATALOG_PATH, items: int = 60, embedded: bool = False):
+    for i in range(pages + 1):
+        page_path = path if i == 0 else f'{path}page-{i}/'
+        target = os.path.join(out, page_path.strip('/'), 'index.html')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(synthetic_page(items=items, pages=pages, seed=max(i, 1), embedded=embedded))
+
+
+class Stats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self._lock:
+            self.latencies = []
+            self.statuses = {}
+            self.bytes = 0
+
+
+    def record(self, status: int, latency: float, size: int):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes += size
+
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            data = sorted(self.latencies)
+        if not data:
+            return 0.0
+        return data[min(int(q * len(data)), len(data) - 1)]
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fixtures: str, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0) -> None:
+        super().__init__(('127.0.0.1', port), Handler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = Stats()
+
+
+    @property
+    def host(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+    def start(self) -> 'MockServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+    def _send(self, status: int, body: bytes = b'', headers: dict = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET(self):
+        server = self.server
+        start = time.perf_counter()
+        time.sleep(max(server.latency + random.uniform(-server.jitter, server.jitter), 0))
+
+        path = os.path.normpath(os.path.join(server.fixtures, self.path.split('?')[0].strip('/'), 'index.html'))
+        if random.random() < server.error_rate:
+            status, body, headers = 503, b'', {'Retry-After': '0'}
+        elif path.startswith(os.path.abspath(server.fixtures)) and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                status, body, headers = 200, f.read(), {'Content-Type': 'text/html; charset=utf-8'}
+        else:
+            status, body, headers = 404, b'', {}
+        self._send(status, body, headers)
+        server.stats.record(status, time.perf_counter() - start, len(body))
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument('--fixtures')
+    args.add_argument('--synthetic-pages', type=int, default=50)
+    args.add_argument('--port', type=int, default=8765)
+    args.add_argument('--latency-ms', type=float, default=20)
+    args.add_argument('--jitter-ms', type=float, default=10)
+    args.add_argument('--error-rate', type=float, default=0.0)
+    args = args.parse_args()
+
+    fixtures = args.fixtures
+    if not fixtures:
+        import tempfile
+        fixtures = tempfile.mkdtemp(prefix='krossy-fixtures-')
+        write_synthetic_catalog(fixtures, args.synthetic_pages)
+    server = MockServer(
+        os.path.abspath(fixtures), args.port, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate,
+    )
+    print(f'serving {fixtures} on {server.host}{CATALOG_PATH}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Record catalog pages once, for mock_server.py to replay.
+#
+#   python benchmarks/record.py https://megasport.ua /ua/catalog/krossovki-i-snikersi/male/ [--out DIR] [--pages N]
+#
+# Pages are stored under DIR mirroring their URL paths (<path>/index.html).
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from krossy import ClientWeb, ExtractBootsMaleItems
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def save(out: str, url_path: str, body: bytes):
+    target = os.path.join(out, url_path.strip('/'), 'index.html')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(body)
+
+
+def record(host: str, path: str, out: str = FIXTURES, pages: int = None) -> int:
+    client = ClientWeb()
+    try:
+        extractor = ExtractBootsMaleItems(client=client, host=host, path=path)
+        urls = extractor._get_pages_urls()
+        if pages:
+            urls.end = min(urls.end or pages, pages)
+        save(out, path, client.get_body_by_url(host + path))
+        recorded = 1
+        # page 1 comes from the page count lookup, the rest until the catalog ends
+        for url, body in extractor._iter_bodies(urls):
+            if extractor._page_is_empty(body):
+                urls.mark_empty(url)
+                continue
+            save(out, url[len(host):], body)
+            recorded += 1
+        return recorded
+    finally:
+        client.close()
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument('host')
+    args.add_argument('path')
+    args.add_argument('--out', default=FIXTURES)
+    args.add_argument('--pages', type=int, help='record at most N pages')
+    args = args.parse_args()
+    print(f'recorded {record(args.host, args.path, args.out, args.pages)} pages to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
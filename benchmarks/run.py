@@ -0,0 +1,189 @@
+# End-to-end benchmark of the krossy.py, Prefect and Scrapy front ends
+# against the local mock server.
+#
+#   python benchmarks/run.py [--fixtures DIR | --synthetic-pages N [--embedded]] [--latency-ms 20]
+#                            [--error-rate 0.0] [--frontends krossy prefect scrapy] [--out DIR]
+#
+# Every front end runs in its own process (so peak RSS is its own) and writes
+# to a throwaway SQLite file. Fetch latency percentiles are measured by the
+# server, per request, including the injected latency. Results are saved as
+# JSON under --out to compare versions.
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from mock_server import CATALOG_PATH, MockServer, write_synthetic_catalog
+
+
+FRONTENDS = ['krossy', 'prefect', 'scrapy']
+RESULTS = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def run_krossy(host: str, db: str, embedded: bool):
+    import krossy
+    client = krossy.ClientWeb()
+    try:
+        extractor = krossy.ExtractBootsMaleItems(client=client, host=host, path=CATALOG_PATH, embedded=embedded)
+        krossy.stream_etl(extractor, krossy.Transform(), krossy.ClientDB(db=db))
+    finally:
+        client.close()
+
+
+def run_prefect(host: str, db: str, embedded: bool):
+    import krossy_prefect
+    krossy_prefect.etl_flow(host=host, path=CATALOG_PATH, db_path=db, db_table='krossy_table', embedded=embedded)
+
+
+def run_scrapy(host: str, db: str, embedded: bool):
+    os.chdir(os.path.join(ROOT, 'krossy_project'))
+    sys.path.insert(0, os.getcwd())
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    settings = get_project_settings()
+    settings.set('KROSSY_DB', db)
+    settings.set('HTTPCACHE_ENABLED', False)
+    settings.set('ROBOTSTXT_OBEY', False)
+    settings.set('LOG_LEVEL', 'WARNING')
+    process = CrawlerProcess(settings)
+    process.crawl('boots', start_url=host + CATALOG_PATH, embedded='1' if embedded else '0')
+    process.start()
+
+
+def child(frontend: str, host: str, db: str, embedded: bool = False):
+    from krossy_metrics import metrics
+    start = time.perf_counter()
+    error = None
+    try:
+        globals()[f'run_{frontend}'](host, db, embedded)
+    except Exception as e:
+        error = repr(e)
+    elapsed = time.perf_counter() - start
+
+    import sqlite3
+    try:
+        items = sqlite3.connect(db).execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
+    except sqlite3.Error:
+        items = 0
+    # ru_maxrss is in KiB on Linux
+    print(json.dumps({
+        'elapsed_s': elapsed,
+        'items': items,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'db_write_s': metrics.summary()['stages'].get('db_write', {}).get('total_s', 0.0),
+        'stages': metrics.summary()['stages'],
+        'error': error,
+    }))
+
+
+def bench(frontend: str, server: MockServer, embedded: bool = False) -> dict:
+    server.stats.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'bench.db')
+        proc = subprocess.run(
+            [sys.executable, __file__, '--child', frontend, '--host', server.host, '--db', db]
+            + (['--embedded'] if embedded else []),
+            capture_output=True, text=True,
+        )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode or not lines:
+        return {'error': proc.stderr.strip().splitlines()[-1:] or 'no output'}
+    result = json.loads(lines[-1])
+    pages = server.stats.statuses.get(200, 0)
+    elapsed = result['elapsed_s']
+    result.update({
+        'pages': pages,
+        'requests': sum(server.stats.statuses.values()),
+        'statuses': server.stats.statuses,
+        'bytes': server.stats.bytes,
+        'pages_per_s': pages / elapsed if elapsed else 0.0,
+        'items_per_s': result['items'] / elapsed if elapsed else 0.0,
+        'fetch_p50_ms': server.stats.percentile(0.50) * 1000,
+        'fetch_p99_ms': server.stats.percentile(0.99) * 1000,
+    })
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main():
+    args = argparse.ArgumentParser()
+    args.add_argument('--fixtures')
+    args.add_argument('--synthetic-pages', type=int, default=50)
+    args.add_argument('--embedded', action='store_true', help='synthetic pages also carry their products as JSON-LD, read in embedded mode')
+    args.add_argument('--latency-ms', type=float, default=20)
+    args.add_argument('--jitter-ms', type=float, default=10)
+    args.add_argument('--error-rate', type=float, default=0.0)
+    args.add_argument('--frontends', nargs='+', choices=FRONTENDS, default=FRONTENDS)
+    args.add_argument('--out', default=RESULTS)
+    args.add_argument('--child', choices=FRONTENDS, help=argparse.SUPPRESS)
+    args.add_argument('--host', help=argparse.SUPPRESS)
+    args.add_argument('--db', help=argparse.SUPPRESS)
+    args = args.parse_args()
+
+    if args.child:
+        return child(args.child, args.host, args.db, args.embedded)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = args.fixtures
+        if not fixtures:
+            fixtures = tmp
+            write_synthetic_catalog(fixtures, args.synthetic_pages, embedded=args.embedded)
+        server = MockServer(
+            os.path.abspath(fixtures),
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+        ).start()
+
+        report = {
+            'revision': git_revision(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': {
+                'fixtures': args.fixtures or f'synthetic:{args.synthetic_pages}' + (':embedded' if args.embedded else ''),
+                'latency_ms': args.latency_ms,
+                'jitter_ms': args.jitter_ms,
+                'error_rate': args.error_rate,
+            },
+            'frontends': {},
+        }
+        for frontend in args.frontends:
+            result = report['frontends'][frontend] = bench(frontend, server, args.embedded)
+            if 'pages' in result:
+                print(
+                    f"{frontend:>8}: {result['pages']} pages, {result['items']} items in {result['elapsed_s']:.2f}s"
+                    f" | {result['pages_per_s']:.1f} pages/s, {result['items_per_s']:.0f} items/s"
+                    f" | fetch p50 {result['fetch_p50_ms']:.0f}ms p99 {result['fetch_p99_ms']:.0f}ms"
+                    f" | rss {result['peak_rss_mb']:.0f}MB | db {result['db_write_s']:.3f}s"
+                )
+            else:
+                print(f"{frontend:>8}: failed: {result['error']}")
+        server.shutdown()
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{report['date'].replace(':', '')}-{report['revision'] or 'local'}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'saved {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,54 @@
-import requests
-import sqlite3
+import asyncio
+import hashlib
+import importlib.util
 import logging
+import multiprocessing
+import threading
 import pandas as pd
-from pprint import pprint
-from bs4 import BeautifulSoup, Tag
-from typing import Tuple
+from bs4 import BeautifulSoup
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
 from abc import ABC, abstractmethod
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
 
+from krossy_buffers import PageRef, PageRing, page_view
+from krossy_cache import ResponseCache
+from krossy_fetch import AsyncClientWeb, DEFAULT_HEADERS, FetchError, MAX_CONCURRENCY, MAX_PER_HOST
+from krossy_metrics import metrics
+from krossy_parsers import JsonParser, LxmlParser, Markup, ParserBackend, SoupParser
+from krossy_rows import RowBuffer
+from krossy_spec import BOOTS, CompiledSpec, grid_fragment
+from krossy_storage import Storage
+
 
 logger = logging.getLogger()
 logging.basicConfig(level=logging.INFO)
 
 
-MAX_THREADS = 100
-
+BATCH_SIZE = 1000
+COURSE = 35
+# this many consecutive pages without a product grid end the catalog
+EMPTY_PAGES_STOP = 2
+# pages in flight while probing a catalog of unknown length; bounds the requests past its end
+PROBE_WINDOW = 8
+# this many consecutive pages failing after retries end the crawl: the site is down or throttling us
+FAILED_PAGES_STOP = 5
+# hard cap on page numbers when the count is unknown, e.g. for sites that redirect
+# out-of-range pages back to a real one
+MAX_PAGES = 1000
+STRING_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else 'category'
 
 class Schemes:
     RAW = ["name", "price_ua", "link"]
     OUT = RAW + ["date", "price_us"]
 
 
+# (name, price_ua, link), in Schemes.RAW order
+Row = Tuple[Optional[str], Optional[int], Optional[str]]
+
+
 class NoItemsError(Exception):
     pass
 
@@ -31,49 +57,294 @@ class EmptyDfError(Exception):
     pass
 
 
+class UnknownSiteError(Exception):
+    pass
+
+
 class ClientWeb:
-    def __init__(self,) -> None:
-        
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:78.0)   Gecko/20100101 Firefox/78.0",
-            "Accept": "*/*",
-            "Referer": "https://megasport.ua",
-        }
+    # Sync facade over AsyncClientWeb: the event loop lives in a daemon thread,
+    # so every caller (and every thread) shares one pooled keep-alive client.
+    def __init__(
+        self,
+        concurrency: int = MAX_CONCURRENCY,
+        per_host: int = MAX_PER_HOST,
+        http2: bool = True,
+        cache: ResponseCache = None,
+        host_limits: Dict[str, int] = None,
+        rate: float = None,
+        host_rates: Dict[str, float] = None,
+    ) -> None:
+        self.headers = dict(DEFAULT_HEADERS)
+        self.engine = AsyncClientWeb(
+            headers=self.headers, concurrency=concurrency, per_host=per_host, http2=http2, cache=cache,
+            host_limits=host_limits, rate=rate, host_rates=host_rates,
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._run(self.engine.open())
+
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+
+    def _run(self, coro):
+        return self._submit(coro).result()
+
+
+    def get_text_by_url(self, url: str) -> str:
+        return self._run(self.engine.fetch(url))
+
+
+    def get_body_by_url(self, url: str) -> bytes:
+        return self._run(self.engine.fetch_bytes(url))
+
+
+    def _iter_by_urls(self, fetch, urls: Iterable[str], window: int = None, not_found=None, on_failure: Callable[[str], None] = None) -> Iterator[Tuple[str, object]]:
+        # Yields (url, body) as responses arrive; at most `window` pages are
+        # in flight or waiting to be consumed, so memory does not grow with the catalog.
+        # `urls` is pulled lazily, one url per finished page, so it may be unbounded
+        # or stop early. With `not_found` set, a 404 yields (url, not_found) instead of failing;
+        # other failures are passed to `on_failure` before the next url is pulled.
+        window = window or self.engine.concurrency * 2
+        urls = iter(urls)
+        pending = {}
+        for url in urls:
+            pending[self._submit(fetch(url))] = url
+            if len(pending) >= window:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # in submission order, so pages finished together are seen (and counted towards a stop) in page order
+            for future in [future for future in pending if future in done]:
+                url = pending.pop(future)
+                try:
+                    body = future.result()
+                except FetchError as e:
+                    if e.status == 404 and not_found is not None:
+                        body = not_found
+                    else:
+                        # a page that still fails after retries is reported, not parsed as empty
+                        logger.error(f'Skipping page: {e}')
+                        metrics.incr('pages_failed')
+                        if on_failure is not None:
+                            on_failure(url)
+                        body = None
+                if body is not None:
+                    yield url, body
+                for url in urls:
+                    pending[self._submit(fetch(url))] = url
+                    break
+
+
+    def iter_bodies_by_urls(self, urls: Iterable[str], window: int = None, not_found: bytes = None, on_failure: Callable[[str], None] = None) -> Iterator[Tuple[str, bytes]]:
+        return self._iter_by_urls(self.engine.fetch_bytes, urls, window, not_found, on_failure)
 
 
     def get_bs_by_url(self, url:str) -> BeautifulSoup:
-        response = requests.get(url, headers=self.headers)
-        response.encoding = 'utf-8'
-        txt = response.text
-        return BeautifulSoup(txt, 'html.parser')
+        return BeautifulSoup(self.get_body_by_url(url), 'html.parser', from_encoding='utf-8')
+
+
+    def close(self):
+        if self._loop.is_running():
+            self._run(self.engine.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
 
 
 class ClientDB:
     def __init__(self, db: str) -> None:
         self.db = db
-        self.con = sqlite3.connect(self.db)
-        self.cursor = self.con.cursor()
+        self.storage = Storage(self.db)
+        self.con = self.storage.con
     
     def write_df_to_db(self, df: pd.DataFrame):
-        df.to_sql(name='krossy_table', con=self.con, if_exists = 'append', chunksize = 1000)
+        return self.storage.write_df(df)
 
 
     def request(self, req: str):
-        response = self.cursor.execute(req)
-        return response.fetchall()
+        return self.storage.query(req)
+
+
+def grid_fingerprint(body: bytes, marker: str) -> Optional[str]:
+    # Hashes the raw product grid without parsing; None (always parse) when it is not found.
+    fragment = grid_fragment(body, marker)
+    return hashlib.sha1(fragment).hexdigest() if fragment is not None else None
+
+
+class Pages:
+    # Catalog page urls 1..count, or 1..max_pages when the count is unknown.
+    # Pages are handed out lazily, so once `max_empty` consecutive page numbers
+    # came back without products, or `max_failed` consecutive ones failed after
+    # retries, no url past that run is requested any more.
+    # With `first` (the url and body of page 1, already fetched to read the
+    # count) iteration starts at page 2.
+    def __init__(
+        self,
+        url: str,
+        count: int = None,
+        max_empty: int = EMPTY_PAGES_STOP,
+        pattern: str = 'page-{n}/',
+        first: Tuple[str, bytes] = None,
+        max_failed: int = FAILED_PAGES_STOP,
+        max_pages: int = MAX_PAGES,
+    ) -> None:
+        self.url = url
+        self.count = count
+        self.max_empty = max_empty
+        self.max_failed = max_failed
+        self.max_pages = max_pages
+        self.pattern = pattern
+        self.first = first
+        self.end = count
+        self.numbers = {}
+        self.empty = set()
+        self.failed = set()
+        self.window = None if count else PROBE_WINDOW
+        if first is not None:
+            self.numbers[first[0]] = 1
+
+
+    def page_url(self, n: int) -> str:
+        return self.url + self.pattern.format(n=n)
+
+
+    def __iter__(self) -> Iterator[str]:
+        start = 1 if self.first is None else 2
+        for n in range(start, (self.count or self.max_pages) + 1):
+            if self.end is not None and n > self.end:
+                return
+            url = self.page_url(n)
+            self.numbers[url] = n
+            yield url
+        if not self.count:
+            logger.warning(f'Stopped at the {self.max_pages} pages cap without reaching the end of the catalog')
+
+
+    def _mark(self, url: str, marked: set, limit: int) -> Optional[int]:
+        # first page number of the run of `limit` consecutive marked pages `url` completes, if any
+        n = self.numbers.get(url)
+        if n is None:
+            return None
+        marked.add(n)
+        start = stop = n
+        while start - 1 in marked:
+            start -= 1
+        while stop + 1 in marked:
+            stop += 1
+        if stop - start + 1 >= limit and (self.end is None or start - 1 < self.end):
+            self.end = start - 1
+            return start
+        return None
+
+
+    def mark_empty(self, url: str):
+        start = self._mark(url, self.empty, self.max_empty)
+        if start is not None:
+            logger.info(f'{self.max_empty} empty pages from page {start}, the catalog ends at page {self.end}')
+
+
+    def mark_failed(self, url: str):
+        start = self._mark(url, self.failed, self.max_failed)
+        if start is not None:
+            logger.error(f'{self.max_failed} pages failed in a row from page {start}, stopping after page {self.end}')
+
+
+class IncrementalState:
+    # Page fingerprints plus the last known (name, price) per product link, read
+    # once from the products table. Page fingerprints are staged in memory and
+    # committed after each DB batch, so a crash never marks a page as seen
+    # before its rows are written.
+    def __init__(self, db: ClientDB) -> None:
+        self.storage = db.storage
+        self.storage.query('CREATE TABLE IF NOT EXISTS krossy_pages (url TEXT PRIMARY KEY, digest TEXT NOT NULL)')
+        self.pages = dict(self.storage.query('SELECT url, digest FROM krossy_pages'))
+        self.items = {link: (name, price) for link, name, price in self.storage.query('SELECT link, name, price_ua FROM products')}
+        self._pages = {}
+        self.skipped_pages = 0
+
+
+    def page_changed(self, url: str, digest: Optional[str]) -> bool:
+        if digest is not None and self.pages.get(url) == digest:
+            self.skipped_pages += 1
+            metrics.incr('pages_unchanged')
+            return False
+        return True
+
+
+    def page_done(self, url: str, digest: Optional[str]):
+        if digest is not None:
+            self._pages[url] = digest
+
+
+    def item_changed(self, row: Row) -> bool:
+        name, price, link = row
+        value = (name, price)
+        if link is None or self.items.get(link) == value:
+            return link is None
+        self.items[link] = value
+        return True
+
+
+    def commit(self):
+        self.storage.executemany('INSERT OR REPLACE INTO krossy_pages VALUES (?, ?)', self._pages.items())
+        self.pages.update(self._pages)
+        self._pages = {}
+
+
+def make_parse_pool(workers: int, **kwargs) -> ProcessPoolExecutor:
+    # spawn: the fetch event loop runs in a thread, which fork would not carry over safely
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), **kwargs)
+
+
+def _parse_page(extractor: 'ExtractItems', body: Markup) -> List[Row]:
+    # Raw page bytes in, compact row tuples out; the parser decodes with the extractor's encoding.
+    return extractor.rows_from_text(body)
+
+
+def _parse_page_in_worker(extractor: 'ExtractItems', body: bytes) -> Tuple[List[Row], dict]:
+    # The worker's parse/extract metrics travel back with its rows.
+    rows = _parse_page(extractor, body)
+    return rows, metrics.drain()
+
+
+def _parse_shared_page(extractor: 'ExtractItems', ref: PageRef) -> Tuple[List[Row], dict]:
+    # Same as _parse_page_in_worker, reading the page in place from the parent's PageRing.
+    with page_view(ref) as view:
+        rows = _parse_page(extractor, view)
+    return rows, metrics.drain()
 
 
 class ExtractItems(ABC):
-    def __init__(self, client: ClientWeb, host: str, path: str):
+    parser: ParserBackend = SoupParser()
+    grid_marker: str = None
+    # declared page encoding, handed to the parser together with the raw bytes
+    encoding: str = 'utf-8'
+    # With an lxml parser, a compiled spec replaces the per-field _get_* lookups.
+    spec: CompiledSpec = None
+    # read rows from the spec's embedded JSON when a page has it, with any parser;
+    # off until the site's embedded data is known to match its grid
+    embedded: bool = False
+    # page n of the catalog is url + page_pattern
+    page_pattern: str = 'page-{n}/'
+
+    def __init__(self, client: ClientWeb, host: str, path: str, parser: ParserBackend = None, embedded: bool = None):
         self.host = host
         self.path = path
         self.url = host + path
         self.client = client
+        if parser is not None:
+            self.parser = parser
+        if embedded is not None:
+            self.embedded = embedded
+        # pages of the current run that failed after retries; the client may be shared by other runs
+        self.failed_urls = []
         self.df = pd.DataFrame(columns=Schemes.RAW)
     
 
     @abstractmethod
-    def _get_pages_count(self) -> int:
+    def _get_pages_count(self, page) -> Optional[int]:
         raise NotImplementedError("Not implemented")
     
 
@@ -97,54 +368,183 @@ class ExtractItems(ABC):
         raise NotImplementedError("Not implemented")
     
 
-    def _get_items_by_all_pages(self):
-        pages = self._get_pages_count(self.url)
-        if not pages:
-            pages = 1
-            logger.warning('Only one page is used for extracting')
-
-        urls = [self.url + f"page-{i}/" for i in range(1, pages)]
-        items = []
-        with ThreadPoolExecutor(max_workers=int(MAX_THREADS)) as executor:
-            bs_pages = list(executor.map(self.client.get_bs_by_url, urls))
-        for page in bs_pages:
-            for item in self._get_items(page):
-                items.append(item)
-
-        if not len(items):
-            logger.error('No any items. Check internet connection or urls')
-            raise NoItemsError
-        
-        return items
+    def _count_pages(self, body: bytes) -> Optional[int]:
+        try:
+            page = self.parser.parse(body, self.encoding)
+        except Exception:
+            return None
+        try:
+            return self._get_pages_count(page)
+        except Exception:
+            return None
+        finally:
+            self.parser.release(page)
 
 
-    def _get_items_by_all_pages_consistently(self):
-        pages = self._get_pages_count(self.url)
-        if not pages:
-            pages = 1
-        pages = 2
-        items = []
-        for i in range(1, pages):
-            url = self.url + f"page-{i}/"
-            sp = self.client.get_bs_by_url(url)
-            for item in self._get_items(sp):
-                items.append(item)
-        return items
+    def _get_pages_urls(self) -> Pages:
+        # Page 1 is fetched once: the page count is read from it and the same
+        # body is then parsed for its items, instead of downloading it twice.
+        pages = Pages(self.url, pattern=self.page_pattern)
+        url = pages.page_url(1)
+        try:
+            body = self.client.get_body_by_url(url)
+        except FetchError as e:
+            # a 404 counts as an empty page; anything else is retried with the other pages
+            logger.warning(f'First page failed: {e}')
+            body = b'' if e.status == 404 else None
+        count = self._count_pages(body) if body else None
+        if not count:
+            logger.warning('Unknown number of pages, fetching until the pages come back empty')
+        return Pages(self.url, count, pattern=self.page_pattern, first=(url, body) if body is not None else None)
+
+
+    def _iter_bodies(self, pages: Pages) -> Iterator[Tuple[str, bytes]]:
+        if pages.first is not None:
+            yield pages.first
+        def on_failure(url: str):
+            self.failed_urls.append(url)
+            pages.mark_failed(url)
+
+        yield from self.client.iter_bodies_by_urls(pages, pages.window, not_found=b'', on_failure=on_failure)
+
+
+    def _page_is_empty(self, body) -> bool:
+        # checked on the raw page, before parsing; without a marker only an empty body counts
+        if not body:
+            return True
+        if self.grid_marker is None:
+            return False
+        marker = self.grid_marker if isinstance(body, str) else self.grid_marker.encode('utf-8')
+        return marker not in body
+
+
+    def _get_row(self, item) -> Row:
+        name = self._get_name(item=item)
+        price, current = self._get_price_current(item=item)
+        link = self._get_items_link(item)
+        return name, price, self._join_url(link) if link else None
+
+
+    def _join_url(self, link: str) -> str:
+        return self.host + link
+
+
+    def _use_spec(self) -> bool:
+        return self.spec is not None and isinstance(self.parser, LxmlParser)
+
+
+    def _use_embedded(self) -> bool:
+        return self.embedded and self.spec is not None and self.spec.embedded is not None
+
+
+    def rows_from_text(self, txt: Markup) -> List[Row]:
+        if self._use_embedded():
+            rows = self.spec.embedded_rows(txt, self.encoding, self._join_url)
+            if rows is not None:
+                metrics.incr('items_extracted', len(rows))
+                return rows
+        with metrics.timer('parse'):
+            page = self.parser.parse(txt, self.encoding)
+        with metrics.timer('extract'):
+            if self._use_spec():
+                rows = self.spec.rows(page, self._join_url)
+            else:
+                rows = [self._get_row(item) for item in self._get_items(page) or []]
+        self.parser.release(page)
+        metrics.incr('items_extracted', len(rows))
+        return rows
+
+
+    def __getstate__(self):
+        # Only what parsing needs travels to parse workers.
+        state = self.__dict__.copy()
+        state['client'] = None
+        state['df'] = None
+        return state
+
+
+    def _iter_changed_pages(self, pages: Pages, state: IncrementalState = None) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+        for url, body in self._iter_bodies(pages):
+            if self._page_is_empty(body):
+                pages.mark_empty(url)
+                metrics.incr('pages_empty')
+                continue
+            digest = None
+            if state is not None:
+                digest = grid_fingerprint(body, self.grid_marker)
+                if not state.page_changed(url, digest):
+                    continue
+            yield url, body, digest
+
+
+    def _iter_page_rows(self, state: IncrementalState = None, pool: Executor = None) -> Iterator[Tuple[str, Optional[str], List[Row]]]:
+        # Pages are fed to the parser in the order they arrive. A page that parses
+        # to no rows also counts towards the early stop.
+        self.failed_urls = []
+        pages = self._get_pages_urls()
+        for url, digest, rows in self._parse_pages(pages, state, pool):
+            if not rows:
+                pages.mark_empty(url)
+            yield url, digest, rows
+
+
+    def _parse_pages(self, pages: Pages, state: IncrementalState = None, pool: Executor = None) -> Iterator[Tuple[str, Optional[str], List[Row]]]:
+        bodies = self._iter_changed_pages(pages, state)
+        if pool is None:
+            for url, body, digest in bodies:
+                yield url, digest, _parse_page(self, body)
+            return
+
+        # Keep a bounded number of pages queued on the workers; each queued
+        # page has its slot in the shared ring.
+        window = getattr(pool, '_max_workers', 4) * 2
+        ring = PageRing(window)
+        pending = {}
+
+        def result(future):
+            url, digest, ref = pending.pop(future)
+            if ref is not None:
+                ring.release(ref)
+            rows, snapshot = future.result()
+            metrics.merge(snapshot)
+            return url, digest, rows
 
+        try:
+            for url, body, digest in bodies:
+                ref = ring.put(body)
+                if ref is not None:
+                    future = pool.submit(_parse_shared_page, self, ref)
+                else:
+                    future = pool.submit(_parse_page_in_worker, self, body)
+                pending[future] = url, digest, ref
+                while len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield result(future)
+            while pending:
+                yield result(next(iter(pending)))
+        finally:
+            # a slot must not be reused or unmapped while a worker may still read it
+            wait(pending)
+            ring.close()
+
+
+    def iter_rows(self, state: IncrementalState = None, pool: Executor = None) -> Iterator[Row]:
+        # Each page is turned into rows and its tree is freed before the next one is parsed;
+        # with a pool the parsing runs in worker processes.
+        # With a state, unchanged pages are not parsed and only new or changed items are yielded.
+        for url, digest, rows in self._iter_page_rows(state, pool):
+            for row in rows:
+                if state is None or state.item_changed(row):
+                    yield row
+            if state is not None:
+                state.page_done(url, digest)
 
-    def extract(self):
-        items = self._get_items_by_all_pages()
-        for item in items:
-            name = self._get_name(item=item)
-            price, current = self._get_price_current(item=item)
-            link = self._get_items_link(item)
-            res = {
-                "name": name,
-                "price_ua": price,
-                "link": self.host + link if link else None,
-            }
 
-            self.df = pd.concat([self.df, pd.DataFrame([res])])
+    def extract(self):
+        buffer = RowBuffer(Schemes.RAW, int_columns=('price_ua',))
+        buffer.extend(self.iter_rows())
+        self.df = buffer.to_dataframe()
 
 
     @property
@@ -157,76 +557,189 @@ class ExtractItems(ABC):
         return self.last_items_count
 
 
+# host -> extractor class, filled by @register_extractor
+EXTRACTORS: Dict[str, type] = {}
+
+
+def register_extractor(*hosts: str):
+    def decorator(cls: type) -> type:
+        for host in hosts:
+            EXTRACTORS[host] = cls
+        return cls
+    return decorator
+
+
+def extractor_for(url: str) -> type:
+    # 'https://www.megasport.ua/ua/...' or 'megasport.ua' -> the extractor registered for
+    # megasport.ua; hosts are registered without 'www.'
+    host = (urlsplit(url).hostname if '//' in url else url.split('/')[0]).lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    cls = EXTRACTORS.get(host)
+    if cls is None:
+        raise UnknownSiteError(f'No extractor registered for {host}')
+    return cls
+
+
+@register_extractor('megasport.ua')
 class ExtractBootsMaleItems(ExtractItems):
-    def _get_items(self, sp: BeautifulSoup) -> Tag:
-        return sp.find('div', class_='Fkfp3V')
+    # Other backends: SoupParser(), SoupParser('lxml') or
+    # StrainedSoupParser(classes=[BOOTS.grid[1]], ids=[BOOTS.pages_id]).
+    # Their _get_* lookups read the selectors from the spec as well.
+    parser = LxmlParser()
+    spec = BOOTS.compile()
+
+    @property
+    def grid_marker(self) -> str:
+        return self.spec.spec.grid[1]
+
 
+    def _find_field(self, item, name: str):
+        field = self.spec.field(name)
+        return field, self.parser.find(item, field.tag, field.cls)
 
-    def _get_name(self, item: Tag) -> str:
+
+    def _get_items(self, sp) -> list:
+        grid = self.parser.find(sp, *self.spec.spec.grid)
+        return self.parser.children(grid) if grid is not None else []
+
+
+    def _get_name(self, item) -> str:
         try:
-            name = item.find('div', class_='ihuxuw').text
-            name = name.replace("\u2009", " ").replace("\xa0", " ")
-            return str(name)
+            field, tag = self._find_field(item, 'name')
+            return field.parse(self.parser.text(tag))
         except Exception:
+            metrics.incr('selector_misses', field='name')
             return None
 
 
-    def _get_price_current(self, item: Tag) -> Tuple[int, str]:
+    def _get_price_current(self, item) -> Tuple[int, str]:
         try:
-            price = item.find('span', class_='MeSmTt').text
-            price, current = price.split("\u2009")
-            price = int(price.replace("\xa0", ""))
-
-            return price, current
+            field, tag = self._find_field(item, 'price_ua')
+            price = self.parser.text(tag)
+            return field.parse(price), price.rpartition("\u2009")[2]
         except Exception:
+            metrics.incr('selector_misses', field='price')
             return None, None
 
 
-    def _get_items_link(self, item: Tag) -> str:
+    def _get_items_link(self, item) -> str:
         try:
-            tag = item.find('a', class_='it25hX')
-            return tag.get('href')
+            field, tag = self._find_field(item, 'link')
+            return self.parser.get(tag, field.attr)
         except Exception:
+            metrics.incr('selector_misses', field='link')
             return None
 
 
-    def _get_pages_count(self, url: str) -> int:
+    def _get_pages_count(self, page) -> Optional[int]:
+        if self._use_spec():
+            return self.spec.pages_count(page)
+        return self.parser.count_children(self.parser.find(page, id=self.spec.spec.pages_id))
+
+
+class JsonApiExtractItems(ExtractItems):
+    # Base for sites with a product JSON endpoint (often the one behind an
+    # infinite scroll): pages are decoded with json.loads and no HTML tree is
+    # built. A subclass points `path` at the endpoint and names the keys;
+    # dotted paths reach into nested objects, e.g. items_key = 'data.products'.
+    parser = JsonParser()
+    page_pattern = '?page={n}'
+    items_key: str = 'items'
+    # total page count in the response, if the API reports one
+    pages_key: str = None
+    name_key: str = 'name'
+    price_key: str = 'price'
+    link_key: str = 'url'
+    currency: str = None
+
+    def _get_items(self, doc) -> list:
+        items = self.parser.find(doc, self.items_key)
+        return items if isinstance(items, list) else []
+
+
+    def _get_name(self, item) -> str:
+        name = self.parser.get(item, self.name_key)
+        if name is None:
+            metrics.incr('selector_misses', field='name')
+        return name
+
+
+    def _get_price_current(self, item) -> Tuple[int, str]:
         try:
-            sp = self.client.get_bs_by_url(url)
-            return len(sp.find(id='select-page'))
-        except Exception:
+            return int(float(self.parser.find(item, self.price_key))), self.currency
+        except (TypeError, ValueError):
+            metrics.incr('selector_misses', field='price')
+            return None, None
+
+
+    def _get_items_link(self, item) -> str:
+        link = self.parser.get(item, self.link_key)
+        if link is None:
+            metrics.incr('selector_misses', field='link')
+        return link
+
+
+    def _get_pages_count(self, doc) -> Optional[int]:
+        if self.pages_key is None:
             return None
+        count = self.parser.find(doc, self.pages_key)
+        return int(count) if count else None
+
+
+    def _join_url(self, link: str) -> str:
+        # APIs often return absolute product urls
+        return urljoin(self.host, link)
 
 
 class Transform:
-    def __init__(self, ) -> None:
+    # Every step takes a frame and returns a new one (assign/dropna), so steps
+    # chain without mutating the caller's frame and without a defensive copy.
+    def __init__(self, course: float = COURSE, steps: List[Callable[[pd.DataFrame], pd.DataFrame]] = None) -> None:
+        self.course = course
+        self.steps = steps if steps is not None else [
+            self.drop_none,
+            self.cast_types,
+            self.add_another_current,
+            self.add_data_time,
+        ]
         self.df = pd.DataFrame(columns=Schemes.OUT)
 
 
-    def drop_none(self, df: pd.DataFrame):
-        logger.info(f'Number of missing items: {df.isnull().any(axis=1).sum()}')
-        df.dropna(inplace=True)
-        
-        if not len(df):
-            logger.error('Empty extract df. Check internet connection or urls')
-            raise EmptyDfError
+    def drop_none(self, df: pd.DataFrame) -> pd.DataFrame:
+        clean = df.dropna()
+        logger.info(f'Number of missing items: {len(df) - len(clean)}')
+        return clean
+
 
+    def cast_types(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.astype({'name': STRING_DTYPE, 'link': STRING_DTYPE, 'price_ua': 'Int32'})
 
-    def add_another_current(self, df: pd.DataFrame):
-        course = 35
-        df.loc[:, 'price_us'] = df.loc[:, 'price_ua'].apply(lambda x: round(x / course, 2))
 
+    def add_another_current(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.assign(price_us=(df['price_ua'] / self.course).round(2))
 
-    def add_data_time(self, df: pd.DataFrame):
-        df.loc[:, 'date'] = datetime.now()
+
+    def add_data_time(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.assign(date=pd.Timestamp(datetime.now()))
+
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        for step in self.steps:
+            df = step(df)
+        return df
+
+
+    def transform_batch(self, batch_df: pd.DataFrame) -> pd.DataFrame:
+        return self.apply(batch_df)
 
 
     def transform(self, extract_df: pd.DataFrame):
-        extract_df = extract_df.copy()
-        self.drop_none(extract_df)
-        self.add_another_current(extract_df)
-        self.add_data_time(extract_df)
-        self.df = pd.concat([self.df, extract_df])
+        df = self.apply(extract_df)
+        if not len(df):
+            logger.error('Empty extract df. Check internet connection or urls')
+            raise EmptyDfError
+        self.df = pd.concat([self.df, df]) if len(self.df) else df
         
 
     @property
@@ -234,44 +747,151 @@ class Transform:
         return self.df
 
 
-def main():
+def stream_etl(
+    extractor: ExtractItems,
+    transform: Transform,
+    db: ClientDB,
+    batch_size: int = BATCH_SIZE,
+    state: IncrementalState = None,
+    parse_workers: int = 0,
+    pool: Executor = None,
+    sink=None,
+    detector=None,
+) -> int:
+    # extract -> transform -> load one bounded batch at a time instead of
+    # materializing the whole catalog first. `sink` (e.g. krossy_parquet.ParquetSink)
+    # gets every written batch as well; `detector` (krossy_changes.ChangeDetector)
+    # sees every batch before it is written.
+    batch = RowBuffer(Schemes.RAW, int_columns=('price_ua',))
+    extracted, written = 0, 0
+
+    def flush():
+        nonlocal written
+        if len(batch):
+            with metrics.timer('transform'):
+                df = transform.transform_batch(batch.flush())
+        else:
+            df = batch.flush()
+        if len(df):
+            if detector is not None:
+                detector.detect(df)
+            db.write_df_to_db(df)
+            if sink is not None:
+                with metrics.timer('sink_write'):
+                    sink.write_df(df)
+            written += len(df)
+        if state is not None:
+            state.commit()
+
+    own_pool = pool is None and parse_workers > 0
+    if own_pool:
+        pool = make_parse_pool(parse_workers)
+    try:
+        for row in extractor.iter_rows(state, pool):
+            batch.append(row)
+            extracted += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch or state is not None:
+            flush()
+    finally:
+        if own_pool:
+            pool.shutdown(cancel_futures=True)
+
+    if extractor.failed_urls:
+        logger.warning(f'Pages failed after retries: {len(extractor.failed_urls)}')
+    if state is not None:
+        logger.info(f'Unchanged pages skipped: {state.skipped_pages}, new or changed items: {extracted}')
+        return written
+    if not extracted:
+        logger.error('No any items. Check internet connection or urls')
+        raise NoItemsError
+    logger.info(f'Number of missing items: {extracted - written}')
+    if not written:
+        logger.error('Empty extract df. Check internet connection or urls')
+        raise EmptyDfError
+    return written
+
+
+def main(
+    incremental: bool = False,
+    parse_workers: int = 0,
+    metrics_path: str = None,
+    profile_path: str = None,
+    profiler: str = 'sample',
+    parquet: str = None,
+    changes_log: str = None,
+    replay: bool = False,
+    embedded: bool = False,
+):
     import time
+    from contextlib import nullcontext
     start = time.time()
+    metrics.reset()
 
 
-    client = ClientWeb()
+    client = ClientWeb(cache=ResponseCache('krossy_cache.db', replay=replay))
     transform = Transform()
     db = ClientDB(db='krossy.db')
 
-    boots_items_extractor = ExtractBootsMaleItems(client=client, host='https://megasport.ua', path='/ua/catalog/krossovki-i-snikersi/male/')
-    boots_items_extractor.extract()
-
-    # print(len(boots_items_extractor.dataframe))
-    # print(boots_items_extractor.dataframe.info())
-    # print('max boots price', boots_items_extractor.dataframe['price_ua'].max())
-    # print('min boots price', boots_items_extractor.dataframe['price_ua'].min())
-
-    transform.transform(boots_items_extractor.dataframe)
-    # print(transform.dataframe.head())
-    # print('min boots price', transform.dataframe['price_ua'].min())
-    
-
-    db.write_df_to_db(transform.dataframe)
-    logger.info(f'It has written to db {len(transform.dataframe)} of items')
-
-
-    # con = sqlite3.connect("krossy.db")
-    # cur = con.cursor()
-    # res = cur.execute("SELECT * FROM krossy_table WHERE price_ua > 8000")
-    # print(res.fetchall())
-
+    host = 'https://megasport.ua'
+    boots_items_extractor = extractor_for(host)(client=client, host=host, path='/ua/catalog/krossovki-i-snikersi/male/', embedded=embedded)
+    state = IncrementalState(db) if incremental else None
+    sink = None
+    if parquet:
+        from krossy_parquet import ParquetSink, category_from_path
+        sink = ParquetSink(parquet, category_from_path(boots_items_extractor.path))
+    detector = None
+    if changes_log:
+        from krossy_changes import ChangeDetector, JsonLinesListener
+        detector = ChangeDetector(db.storage, [JsonLinesListener(changes_log)])
+    if profile_path:
+        from krossy_profile import profiling
+        profile = profiling(profile_path, engine=profiler)
+    else:
+        profile = nullcontext({})
+    with profile as pool_kwargs:
+        pool = make_parse_pool(parse_workers, **pool_kwargs) if parse_workers else None
+        try:
+            written = stream_etl(boots_items_extractor, transform, db, state=state, pool=pool, sink=sink, detector=detector)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    logger.info(f'It has written to db {written} of items')
+    if detector is not None:
+        logger.info(f'Price changes: {detector.changed}')
+
+
+    # print(db.request("SELECT * FROM products WHERE price_ua > 8000"))
+
+    client.close()
+    summary = metrics.summary()
+    logger.info(f"{summary['pages_per_s']:.1f} pages/s, {summary['db_rows_per_s']:.0f} db rows/s")
+    if metrics_path:
+        metrics.write(metrics_path)
     end = time.time()
     print('time: ', end - start)
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true', help='write only new or changed items')
+    parser.add_argument('--parse-workers', type=int, default=0, help='parse pages in N worker processes')
+    parser.add_argument('--metrics', help='write per-stage metrics to this file (.prom for Prometheus text, else JSON)')
+    parser.add_argument('--profile', metavar='PATH', help='profile the run; sample/pyinstrument: *.json is speedscope, cprofile: pstats')
+    parser.add_argument('--profiler', choices=('sample', 'cprofile', 'pyinstrument'), default='sample', help='sample covers every thread and parse worker')
+    parser.add_argument('--parquet', metavar='DIR', help='also write the price history as a Parquet dataset partitioned by category and day')
+    parser.add_argument('--changes-log', metavar='PATH', help='detect price changes and append them to PATH as JSON lines')
+    parser.add_argument('--replay', action='store_true', help='serve every page from krossy_cache.db without touching the network')
+    parser.add_argument('--embedded', action='store_true', help='read products from embedded JSON-LD when it matches the grid')
+    args = parser.parse_args()
     try:
-        main()
+        main(
+            incremental=args.incremental, parse_workers=args.parse_workers, metrics_path=args.metrics,
+            profile_path=args.profile, profiler=args.profiler, parquet=args.parquet,
+            changes_log=args.changes_log, replay=args.replay, embedded=args.embedded,
+        )
     except Exception as e:
         print(e)
         logger.error(e, f'error: {str(e)}')
\ No newline at end of file
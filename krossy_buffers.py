@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+
+SLOT_SIZE = 2 * 1024 * 1024
+# rings a worker keeps mapped; a shared pool outlives the ring of each stream_etl run
+MAX_ATTACHED = 4
+
+# (shared memory name, offset, length, slot)
+PageRef = Tuple[str, int, int, int]
+
+
+class PageRing:
+    # Fixed-size page slots in one shared memory block, for handing fetched
+    # pages to parse workers: the parent copies a page in once and the worker
+    # parses it in place, instead of the bytes being pickled through the pool's
+    # pipe and unpickled again. A slot is reused once its page is parsed;
+    # pages larger than a slot, or with every slot busy, go the pickled way.
+    def __init__(self, slots: int, slot_size: int = SLOT_SIZE) -> None:
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.free: List[int] = list(range(slots))
+
+
+    def put(self, body: bytes) -> Optional[PageRef]:
+        size = len(body)
+        if size > self.slot_size or not self.free:
+            return None
+        slot = self.free.pop()
+        offset = slot * self.slot_size
+        self.shm.buf[offset:offset + size] = body
+        return self.shm.name, offset, size, slot
+
+
+    def release(self, ref: PageRef):
+        self.free.append(ref[3])
+
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+_attached: 'OrderedDict[str, shared_memory.SharedMemory]' = OrderedDict()
+
+
+def page_view(ref: PageRef) -> memoryview:
+    # Worker side: blocks are attached once and the least recently used one is
+    # unmapped past MAX_ATTACHED. Release the returned view before the next call.
+    name, offset, size, _ = ref
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+        while len(_attached) > MAX_ATTACHED:
+            _attached.popitem(last=False)[1].close()
+    _attached.move_to_end(name)
+    return shm.buf[offset:offset + size]
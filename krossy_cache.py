@@ -0,0 +1,123 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class CacheEntry:
+    __slots__ = ("url", "digest", "etag", "last_modified", "body")
+
+    def __init__(self, url: str, digest: str, etag: str, last_modified: str, body: bytes) -> None:
+        self.url = url
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    # URL -> digest entries over content-addressed, zlib-compressed blobs in
+    # one SQLite file. Identical pages share a blob; eviction is LRU by last
+    # access once the compressed size goes over max_bytes. With replay=True the
+    # network is never touched and a miss raises krossy_fetch.CacheMissError.
+    def __init__(self, path: str = 'krossy_cache.db', max_bytes: int = MAX_CACHE_BYTES, replay: bool = False) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self._lock = threading.Lock()
+        self.con = sqlite3.connect(self.path, check_same_thread=False)
+        self.con.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL REFERENCES blobs(digest),
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries(accessed_at);
+        ''')
+
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self.con.execute(
+                'SELECT e.digest, e.etag, e.last_modified, b.body FROM entries e '
+                'JOIN blobs b ON b.digest = e.digest WHERE e.url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.con:
+                self.con.execute('UPDATE entries SET accessed_at = ? WHERE url = ?', (time.time(), url))
+        digest, etag, last_modified, body = row
+        return CacheEntry(url, digest, etag, last_modified, zlib.decompress(body))
+
+
+    def put(self, url: str, body: bytes, etag: str = None, last_modified: str = None):
+        digest = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            exists = self.con.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone()
+            previous = self.con.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchone()
+            with self.con:
+                if not exists:
+                    packed = zlib.compress(body, 6)
+                    self.con.execute('INSERT INTO blobs VALUES (?, ?, ?)', (digest, packed, len(packed)))
+                self.con.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                    (url, digest, etag, last_modified, now, now),
+                )
+                if previous and previous[0] != digest:
+                    self.con.execute(
+                        'DELETE FROM blobs WHERE digest = ? AND NOT EXISTS '
+                        '(SELECT 1 FROM entries WHERE digest = ?)', (previous[0], previous[0]),
+                    )
+            self._evict()
+
+
+    def size(self) -> int:
+        return self.con.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+
+    def _evict(self):
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        with self.con:
+            for url, digest, size in self.con.execute(
+                'SELECT e.url, e.digest, b.size FROM entries e JOIN blobs b ON b.digest = e.digest '
+                'ORDER BY e.accessed_at'
+            ).fetchall():
+                self.con.execute('DELETE FROM entries WHERE url = ?', (url,))
+                # a blob shared by several urls is freed only with its last entry
+                if self.con.execute('SELECT 1 FROM entries WHERE digest = ?', (digest,)).fetchone():
+                    continue
+                self.con.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+                excess -= size
+                if excess <= 0:
+                    break
+
+
+    def close(self):
+        self.con.close()
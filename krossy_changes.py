@@ -0,0 +1,85 @@
+import json
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List
+
+import pandas as pd
+
+from krossy_metrics import metrics
+from krossy_storage import DATE_FORMAT, Storage, _to_list
+
+
+logger = logging.getLogger()
+
+
+CHANGE_COLUMNS = ['link', 'name', 'old_price_ua', 'price_ua', 'date']
+
+
+class PriceIndex:
+    # link -> last known price_ua, read once from the products table. The
+    # products upsert persists it between runs, so detection only looks at the
+    # current batch and never scans price_history.
+    def __init__(self, storage: Storage) -> None:
+        self.prices: Dict[str, int] = dict(storage.query('SELECT link, price_ua FROM products WHERE price_ua IS NOT NULL'))
+
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+
+    def update(self, links: Iterable[str], prices: Iterable[int]):
+        self.prices.update(zip(links, prices))
+
+
+class ChangeDetector:
+    # Stage between Transform and the DB write: compares a batch against the
+    # index, stores the changed items in price_changes and passes them to the
+    # listeners (e.g. JsonLinesListener). New links are only indexed.
+    def __init__(self, storage: Storage, listeners: List[Callable[[pd.DataFrame], None]] = None) -> None:
+        self.storage = storage
+        self.index = PriceIndex(storage)
+        self.listeners = listeners or []
+        self._lock = threading.Lock()
+        self.changed = 0
+
+
+    def detect(self, df: pd.DataFrame) -> pd.DataFrame:
+        with metrics.timer('detect'), self._lock:
+            df = df[df['link'].notna() & df['price_ua'].notna()]
+            links = df['link'].astype(object)
+            old = links.map(self.index.prices).astype('Int64')
+            mask = (old.notna() & (old != df['price_ua'].astype('Int64'))).fillna(False).to_numpy(dtype=bool)
+            changes = pd.DataFrame({
+                'link': links[mask],
+                'name': df['name'].astype(object)[mask],
+                'old_price_ua': old[mask],
+                'price_ua': df['price_ua'].astype('Int64')[mask],
+                'date': df['date'][mask],
+            }, columns=CHANGE_COLUMNS)
+            self.index.update(links.tolist(), df['price_ua'].astype(int).tolist())
+
+        if len(changes):
+            self.storage.write_changes(list(zip(
+                _to_list(changes['link']), _to_list(changes['old_price_ua']), _to_list(changes['price_ua']),
+                pd.to_datetime(changes['date']).dt.strftime(DATE_FORMAT).tolist(),
+            )))
+            self.changed += len(changes)
+            metrics.incr('price_changes', len(changes))
+            for listener in self.listeners:
+                listener(changes)
+        return changes
+
+
+class JsonLinesListener:
+    # Appends one JSON event per changed item, for alerting without touching the DB.
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+
+    def __call__(self, changes: pd.DataFrame):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for link, name, old, new, date in zip(*(_to_list(changes[col]) for col in CHANGE_COLUMNS)):
+                f.write(json.dumps({
+                    'link': link, 'name': name, 'old_price_ua': old, 'price_ua': new,
+                    'change': new - old, 'date': pd.Timestamp(date).isoformat(),
+                }, ensure_ascii=False) + '\n')
@@ -0,0 +1,173 @@
+# Entry point for cron jobs and helpers:
+#
+#   python krossy_cli.py crawl [--config krossy_jobs.json | --prefect] [crawl options]
+#   python krossy_cli.py query "SELECT ..." [--db krossy.db] [--format table|csv|json]
+#   python krossy_cli.py export OUT.{csv,jsonl,parquet} [--db krossy.db] [--since YYYY-MM-DD]
+#   python krossy_cli.py bench {import,e2e} [args...]
+#
+# Only the standard library is imported here. pandas, httpx, bs4/lxml and
+# prefect are imported inside the subcommands that need them, so query and
+# csv/jsonl export start in a few milliseconds. benchmarks/bench_import.py
+# checks that this stays true.
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+
+
+logger = logging.getLogger()
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DB = 'krossy.db'
+HISTORY = 'SELECT h.date, p.name, h.price_ua, h.price_us, h.link FROM price_history h JOIN products p ON p.link = h.link'
+
+
+def connect(db: str) -> sqlite3.Connection:
+    # read-only: queries and exports never take the scraper's write lock
+    if not os.path.exists(db):
+        raise SystemExit(f'No such database: {db}')
+    return sqlite3.connect(f'file:{db}?mode=ro', uri=True)
+
+
+def crawl(args) -> int:
+    if args.config:
+        import krossy_scheduler
+        results = krossy_scheduler.main(args.config)
+        return int(any(count is None for count in results.values()))
+    if args.prefect:
+        import krossy_prefect
+        krossy_prefect.etl_flow(
+            host='https://megasport.ua', path='/ua/catalog/krossovki-i-snikersi/male/',
+            db_path=args.db, db_table='krossy_table', metrics_path=args.metrics, embedded=args.embedded,
+        )
+        return 0
+    import krossy
+    krossy.main(
+        incremental=args.incremental, parse_workers=args.parse_workers, metrics_path=args.metrics,
+        profile_path=args.profile, profiler=args.profiler, parquet=args.parquet, changes_log=args.changes_log,
+        replay=args.replay, embedded=args.embedded,
+    )
+    return 0
+
+
+def _print_table(columns, rows):
+    rows = [['' if value is None else str(value) for value in row] for row in rows]
+    widths = [max([len(col)] + [len(row[i]) for row in rows]) for i, col in enumerate(columns)]
+    print('  '.join(col.ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def query(args) -> int:
+    con = connect(args.db)
+    try:
+        cursor = con.execute(args.sql)
+        columns = [col[0] for col in cursor.description or ()]
+        if args.format == 'csv':
+            writer = csv.writer(sys.stdout)
+            writer.writerow(columns)
+            writer.writerows(cursor)
+        elif args.format == 'json':
+            for row in cursor:
+                print(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        else:
+            _print_table(columns, cursor.fetchall())
+    except sqlite3.Error as e:
+        logger.error(f'Query failed: {e}')
+        return 1
+    finally:
+        con.close()
+    return 0
+
+
+def export(args) -> int:
+    sql, params = HISTORY, ()
+    if args.since:
+        sql, params = sql + ' WHERE h.date >= ?', (args.since,)
+    con = connect(args.db)
+    try:
+        cursor = con.execute(sql + ' ORDER BY h.date', params)
+        columns = [col[0] for col in cursor.description]
+        if args.out.endswith('.parquet'):
+            # the only export path that needs pandas/pyarrow
+            import pandas as pd
+            import krossy_parquet
+            df = pd.DataFrame(cursor.fetchall(), columns=columns)
+            df['date'] = pd.to_datetime(df['date'])
+            count = krossy_parquet.write_df(df, args.out)
+        elif args.out.endswith('.jsonl'):
+            count = 0
+            with open(args.out, 'w', encoding='utf-8') as f:
+                for row in cursor:
+                    f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n')
+                    count += 1
+        else:
+            with open(args.out, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                count = 0
+                for rows in iter(lambda: cursor.fetchmany(10_000), []):
+                    writer.writerows(rows)
+                    count += len(rows)
+    finally:
+        con.close()
+    logger.info(f'{count} rows exported to {args.out}')
+    return 0
+
+
+def bench(args) -> int:
+    script = {'import': 'bench_import.py', 'e2e': 'run.py'}[args.suite]
+    return subprocess.call([sys.executable, os.path.join(ROOT, 'benchmarks', script), *args.args])
+
+
+def parser() -> argparse.ArgumentParser:
+    main = argparse.ArgumentParser(prog='krossy')
+    commands = main.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('crawl', help='scrape and write to the DB')
+    p.set_defaults(run=crawl)
+    p.add_argument('--config', help='run the jobs of a scheduler JSON config')
+    p.add_argument('--prefect', action='store_true', help='run the Prefect flow instead')
+    p.add_argument('--db', default=DB, help='DB of the Prefect flow')
+    p.add_argument('--incremental', action='store_true', help='write only new or changed items')
+    p.add_argument('--parse-workers', type=int, default=0, help='parse pages in N worker processes')
+    p.add_argument('--metrics', help='write per-stage metrics to this file (.prom for Prometheus text, else JSON)')
+    p.add_argument('--profile', metavar='PATH', help='profile the run; sample/pyinstrument: *.json is speedscope, cprofile: pstats')
+    p.add_argument('--profiler', choices=('sample', 'cprofile', 'pyinstrument'), default='sample')
+    p.add_argument('--parquet', metavar='DIR', help='also write the price history as a Parquet dataset')
+    p.add_argument('--changes-log', metavar='PATH', help='detect price changes and append them to PATH as JSON lines')
+    p.add_argument('--replay', action='store_true', help='serve every page from krossy_cache.db without touching the network')
+    p.add_argument('--embedded', action='store_true', help='read products from embedded JSON-LD when it matches the grid')
+
+    p = commands.add_parser('query', help='run SQL against the DB (read-only)')
+    p.set_defaults(run=query)
+    p.add_argument('sql')
+    p.add_argument('--db', default=DB)
+    p.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+
+    p = commands.add_parser('export', help='export the price history (.csv, .jsonl or .parquet)')
+    p.set_defaults(run=export)
+    p.add_argument('out')
+    p.add_argument('--db', default=DB)
+    p.add_argument('--since', help='only rows with date >= SINCE, e.g. 2024-05-01')
+
+    p = commands.add_parser('bench', help='run a benchmark suite')
+    p.set_defaults(run=bench)
+    p.add_argument('suite', choices=('import', 'e2e'))
+    p.add_argument('args', nargs=argparse.REMAINDER, help='passed to the suite')
+    return main
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    args = parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import json
+import re
+from typing import Any, Callable, Iterator, List, Optional
+
+from krossy_metrics import metrics
+from krossy_parsers import JsonParser, Markup
+
+
+SCRIPT_END = re.compile(rb'</script', re.I)
+
+_decoder = json.JSONDecoder()
+_json = JsonParser()
+
+
+def _scripts(body: Markup, script: 're.Pattern', encoding: str) -> Iterator[str]:
+    # Decoded contents of the <script> tags whose opening tag matches `script`.
+    # Only these slices are decoded; the rest of the page stays raw bytes.
+    if isinstance(body, str):
+        body, encoding = body.encode('utf-8'), 'utf-8'
+    pos = 0
+    while True:
+        start = script.search(body, pos)
+        if start is None:
+            return
+        end = SCRIPT_END.search(body, start.end())
+        if end is None:
+            return
+        yield bytes(body[start.end():end.start()]).decode(encoding, errors='replace')
+        pos = end.end()
+
+
+def load_json(text: str) -> Any:
+    # The first JSON value in a script, e.g. after `window.__STATE__ =`.
+    # raw_decode stops at the end of that value, so trailing JS is never read.
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError('no JSON value')
+    return _decoder.raw_decode(text, min(starts))[0]
+
+
+def _str(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) and value else None
+
+
+def _price(value: Any) -> Optional[int]:
+    # 12999, 12999.0, "12999.00" or "12 999"
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(float(value.replace('\xa0', '').replace(' ', '').replace(',', '.')))
+        except ValueError:
+            return None
+    return None
+
+
+class JsonLd:
+    # schema.org Products in <script type="application/ld+json">: on their own,
+    # inside an @graph or as the elements of an ItemList.
+    name = 'json-ld'
+    script = re.compile(rb'<script[^>]*application/ld\+json[^>]*>', re.I)
+
+    def items(self, doc: Any) -> Iterator[dict]:
+        if isinstance(doc, list):
+            for node in doc:
+                yield from self.items(node)
+            return
+        if not isinstance(doc, dict):
+            return
+        kind = doc.get('@type')
+        if kind == 'Product':
+            yield doc
+        elif kind == 'ItemList':
+            for element in doc.get('itemListElement') or []:
+                yield from self.items(element.get('item', element) if isinstance(element, dict) else element)
+        elif '@graph' in doc:
+            yield from self.items(doc['@graph'])
+
+
+    def row(self, item: dict) -> tuple:
+        offers = item.get('offers')
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        price = None
+        if isinstance(offers, dict):
+            price = _price(offers.get('price', offers.get('lowPrice')))
+        return _str(item.get('name')), price, _str(item.get('url'))
+
+
+class Hydration:
+    # State blob of a client-rendered page, e.g. <script id="__NEXT_DATA__"> or
+    # `window.__INITIAL_STATE__ = {...}`: `script` matches the opening tag,
+    # `items` is the key path to the product list and the other paths are
+    # relative to one product.
+    name = 'hydration'
+
+    def __init__(self, script: bytes, items: str, name: str = 'name', price: str = 'price', link: str = 'url') -> None:
+        self.script = re.compile(script, re.I)
+        self.items_path = items
+        self.name_path = name
+        self.price_path = price
+        self.link_path = link
+
+
+    def items(self, doc: Any) -> Iterator[dict]:
+        items = _json.find(doc, self.items_path)
+        if isinstance(items, list):
+            yield from (item for item in items if isinstance(item, dict))
+
+
+    def row(self, item: dict) -> tuple:
+        return (
+            _str(_json.find(item, self.name_path)),
+            _price(_json.find(item, self.price_path)),
+            _str(_json.find(item, self.link_path)),
+        )
+
+
+class Embedded:
+    # Fast path ahead of the DOM extractor: rows straight from structured data
+    # in the page, without building a tree. rows() returns None (and the caller
+    # falls back to the selectors) unless a source gives at least one product,
+    # every product it gives is complete and, with `expected` (the item count of
+    # the page's grid), there are exactly that many, so a partial blob such as
+    # a single SEO Product never replaces the full grid. `clean` normalizes
+    # names the way the DOM fields do.
+    def __init__(self, *sources, clean: Callable[[str], str] = None) -> None:
+        self.sources = sources
+        self.clean = clean
+
+
+    def rows(
+        self,
+        body: Markup,
+        encoding: str = 'utf-8',
+        join_url: Callable[[str], str] = None,
+        expected: int = None,
+    ) -> Optional[List[tuple]]:
+        reason = 'missing'
+        for source in self.sources:
+            rows = []
+            for text in _scripts(body, source.script, encoding):
+                try:
+                    doc = load_json(text)
+                except ValueError:
+                    continue
+                rows.extend(source.row(item) for item in source.items(doc))
+            if not rows:
+                continue
+            if any(None in row for row in rows):
+                reason = 'incomplete'
+                continue
+            if expected is not None and len(rows) != expected:
+                reason = 'count'
+                continue
+            metrics.incr('embedded_pages', source=source.name)
+            clean = self.clean or (lambda name: name)
+            join = join_url or (lambda link: link)
+            return [(clean(name), price, link if '://' in link else join(link)) for name, price, link in rows]
+        metrics.incr('embedded_fallbacks', reason=reason)
+        return None
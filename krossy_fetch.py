@@ -0,0 +1,333 @@
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from krossy_cache import ResponseCache
+from krossy_metrics import metrics
+
+
+logger = logging.getLogger()
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:78.0)   Gecko/20100101 Firefox/78.0",
+    "Accept": "*/*",
+    "Referer": "https://megasport.ua",
+}
+
+MAX_CONCURRENCY = 32
+MAX_PER_HOST = 16
+TIMEOUT = 30.0
+DEADLINE = 120.0
+RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+class FetchError(Exception):
+    def __init__(self, url: str, status: int = None) -> None:
+        super().__init__(f'{url}: ' + (f'HTTP {status}' if status else 'request failed'))
+        self.url = url
+        self.status = status
+
+
+class CacheMissError(FetchError):
+    # replay mode: the page was never cached, so it is skipped like a missing page
+    def __init__(self, url: str) -> None:
+        super().__init__(url, 404)
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int) -> float:
+    # full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = None) -> None:
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Deadline:
+    # Time budget of one request across its retries. Only the sends and the
+    # backoff sleeps are charged, not the time queued for a token or a slot,
+    # so pages waiting behind a throttled or rate-limited host do not expire
+    # before they are sent. run() raises asyncio.TimeoutError once it is spent.
+    def __init__(self, seconds: float) -> None:
+        self.left = seconds
+
+
+    async def run(self, aw):
+        start = time.monotonic()
+        try:
+            return await asyncio.wait_for(aw, max(self.left, 0.0))
+        finally:
+            self.left -= time.monotonic() - start
+
+
+class AdaptiveLimiter:
+    # AIMD concurrency per host: +1/limit per healthy response, halved on
+    # 429/503 or when latency climbs above twice the best smoothed latency seen.
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.decreased_at = 0.0
+        self._cond = asyncio.Condition()
+
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+
+    def record(self, latency: float, throttled: bool = False):
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if self.best_latency is None or self.latency < self.best_latency:
+            self.best_latency = self.latency
+        if throttled or self.latency > 2 * self.best_latency:
+            # at most one decrease per round trip, so one slow burst is not counted many times
+            now = time.monotonic()
+            if now - self.decreased_at > self.latency:
+                self.limit = max(1.0, self.limit / 2)
+                self.decreased_at = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+
+class AsyncClientWeb:
+    # One pooled keep-alive httpx client shared by every request of a crawl.
+    # `concurrency` caps the requests in flight overall. Per host, an adaptive
+    # limit (at most `per_host`, or `host_limits[host]`) backs off on 429/503
+    # and rising latency, and `rate`/`host_rates` requests per second are
+    # enforced by a token bucket. Failed requests are retried with jittered
+    # exponential backoff, honouring Retry-After, within `deadline` seconds of
+    # sending and backing off (time queued for a token or a slot is not counted).
+    # HTTP/2 is negotiated through ALPN when the server supports it. With a
+    # ResponseCache, cached pages are revalidated with conditional requests and
+    # served from disk on 304 (or without any request in replay mode).
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        concurrency: int = MAX_CONCURRENCY,
+        per_host: int = MAX_PER_HOST,
+        http2: bool = True,
+        timeout: float = TIMEOUT,
+        cache: ResponseCache = None,
+        host_limits: Optional[Dict[str, int]] = None,
+        rate: float = None,
+        host_rates: Optional[Dict[str, float]] = None,
+        retries: int = RETRIES,
+        deadline: float = DEADLINE,
+    ) -> None:
+        self.headers = headers if headers is not None else dict(DEFAULT_HEADERS)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_limits = host_limits or {}
+        self.rate = rate
+        self.host_rates = host_rates or {}
+        self.retries = retries
+        self.deadline = deadline
+        self.http2 = http2 and importlib.util.find_spec('h2') is not None
+        self.timeout = timeout
+        self.cache = cache
+        self._client = None
+        self._semaphore = None
+        self._host_limiters = {}
+        self._host_buckets = {}
+
+
+    async def open(self):
+        if self._client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            http2=self.http2,
+            limits=limits,
+            timeout=self.timeout,
+            follow_redirects=True,
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    def _host_limiter(self, host: str) -> AdaptiveLimiter:
+        if host not in self._host_limiters:
+            self._host_limiters[host] = AdaptiveLimiter(self.host_limits.get(host, self.per_host))
+        return self._host_limiters[host]
+
+
+    def _host_bucket(self, host: str) -> Optional[TokenBucket]:
+        if host not in self._host_buckets:
+            rate = self.host_rates.get(host, self.rate)
+            self._host_buckets[host] = TokenBucket(rate) if rate else None
+        return self._host_buckets[host]
+
+
+    async def _get_once(self, url: str, host: str, deadline: Deadline, headers: Dict[str, str] = None) -> httpx.Response:
+        bucket = self._host_bucket(host)
+        limiter = self._host_limiter(host)
+        if bucket is not None:
+            await bucket.acquire()
+        # host slot first: requests queued behind a slow or throttled host must
+        # not hold global slots that other hosts could use
+        async with limiter, self._semaphore:
+            start = time.monotonic()
+            response = await deadline.run(self._client.get(url, headers=headers))
+        latency = time.monotonic() - start
+        throttled = response.status_code in THROTTLE_STATUSES
+        limiter.record(latency, throttled)
+        metrics.observe('fetch', latency)
+        metrics.incr('http_responses', status=response.status_code)
+        if throttled and bucket is not None:
+            bucket.pause(retry_after(response) or 0.0)
+        return response
+
+
+    async def _get_with_retries(self, url: str, headers: Dict[str, str] = None) -> httpx.Response:
+        host = urlsplit(url).netloc
+        deadline = Deadline(self.deadline)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self._get_once(url, host, deadline, headers)
+            except httpx.TransportError as e:
+                if last:
+                    raise FetchError(url) from e
+                logger.warning(f'{url}: {e!r}, retrying')
+                metrics.incr('retries')
+                await deadline.run(asyncio.sleep(backoff(attempt)))
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                break
+            if last:
+                break
+            delay = max(backoff(attempt), retry_after(response) or 0.0)
+            logger.warning(f'{url}: HTTP {response.status_code}, retrying in {delay:.1f}s')
+            metrics.incr('retries')
+            await deadline.run(asyncio.sleep(delay))
+
+        if response.status_code >= 400:
+            raise FetchError(url, response.status_code)
+        return response
+
+
+    async def _get(self, url: str, headers: Dict[str, str] = None) -> httpx.Response:
+        await self.open()
+        try:
+            return await self._get_with_retries(url, headers)
+        except asyncio.TimeoutError as e:
+            raise FetchError(url) from e
+
+
+    async def _fetch_cached(self, url: str) -> bytes:
+        entry = await asyncio.to_thread(self.cache.get, url)
+        if self.cache.replay:
+            if entry is None:
+                raise CacheMissError(url)
+            metrics.incr('cache_hits', kind='replay')
+            return entry.body
+
+        response = await self._get(url, headers=entry.validators() if entry else None)
+        if response.status_code == 304 and entry is not None:
+            metrics.incr('cache_hits', kind='304')
+            return entry.body
+
+        body = response.content
+        if response.status_code == 200:
+            await asyncio.to_thread(
+                self.cache.put, url, body,
+                response.headers.get('ETag'), response.headers.get('Last-Modified'),
+            )
+        return body
+
+
+    async def fetch_bytes(self, url: str) -> bytes:
+        if self.cache is not None:
+            body = await self._fetch_cached(url)
+        else:
+            body = (await self._get(url)).content
+        metrics.incr('pages_fetched')
+        metrics.incr('bytes_fetched', len(body))
+        return body
+
+
+    async def fetch(self, url: str) -> str:
+        return (await self.fetch_bytes(url)).decode('utf-8', errors='replace')
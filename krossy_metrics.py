@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, str]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    # Process-wide counters and per-stage timings (count/total/max seconds).
+    # Parse workers drain() their own instance and the parent merge()s it.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.counters = {}
+            self.timings = {}
+
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            count, total, peak = self.timings.get(stage, (0, 0.0, 0.0))
+            self.timings[stage] = (count + 1, total + seconds, max(peak, seconds))
+
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+
+    def counter(self, name: str, **labels) -> float:
+        if labels:
+            return self.counters.get(_key(name, labels), 0)
+        return sum(value for (key, _), value in self.counters.items() if key == name)
+
+
+    def drain(self) -> dict:
+        with self._lock:
+            snapshot = {'counters': self.counters, 'timings': self.timings}
+            self.counters, self.timings = {}, {}
+        return snapshot
+
+
+    def merge(self, snapshot: dict):
+        with self._lock:
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for stage, (count, total, peak) in snapshot['timings'].items():
+                c, t, p = self.timings.get(stage, (0, 0.0, 0.0))
+                self.timings[stage] = (c + count, t + total, max(p, peak))
+
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        db_s = self.timings.get('db_write', (0, 0.0, 0.0))[1]
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            label = ','.join(f'{k}={v}' for k, v in labels)
+            counters[f'{name}{{{label}}}' if label else name] = value
+        return {
+            'elapsed_s': elapsed,
+            'pages_per_s': self.counter('pages_fetched') / elapsed if elapsed else 0.0,
+            'db_rows_per_s': self.counter('db_rows') / db_s if db_s else 0.0,
+            'counters': counters,
+            'stages': {
+                stage: {'count': count, 'total_s': total, 'max_s': peak, 'mean_s': total / count if count else 0.0}
+                for stage, (count, total, peak) in sorted(self.timings.items())
+            },
+        }
+
+
+    def to_prometheus(self, prefix: str = 'krossy') -> str:
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            label = ','.join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f'{prefix}_{name}_total{{{label}}} {value}' if label else f'{prefix}_{name}_total {value}')
+        for stage, (count, total, peak) in sorted(self.timings.items()):
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_max{{stage="{stage}"}} {peak}')
+        lines.append(f'{prefix}_run_seconds {time.perf_counter() - self.started}')
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self, path: str):
+        # .prom -> Prometheus text format (node_exporter textfile collector), anything else -> JSON
+        with open(path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=2)
+
+
+metrics = Metrics()
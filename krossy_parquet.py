@@ -0,0 +1,150 @@
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+logger = logging.getLogger()
+
+
+COMPRESSION = 'zstd'
+DICTIONARY_COLUMNS = ['name', 'link']
+COMPACT_MIN_FILES = 2
+
+
+class ParquetError(Exception):
+    pass
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ParquetError('The Parquet sink needs pyarrow: pip install pyarrow')
+
+
+def category_from_path(path: str) -> str:
+    # '/ua/catalog/krossovki-i-snikersi/male/' -> 'krossovki-i-snikersi-male'
+    parts = [part for part in path.split('/') if part and part not in ('ua', 'ru', 'catalog')]
+    return '-'.join(parts) or 'default'
+
+
+def schema() -> 'pa.Schema':
+    _require_pyarrow()
+    return pa.schema([
+        ('name', pa.dictionary(pa.int32(), pa.string())),
+        ('price_ua', pa.int32()),
+        ('link', pa.dictionary(pa.int32(), pa.string())),
+        ('price_us', pa.float64()),
+        ('date', pa.timestamp('us')),
+    ])
+
+
+def _to_table(df: pd.DataFrame) -> 'pa.Table':
+    columns = []
+    for field in schema():
+        values = df[field.name]
+        if pa.types.is_dictionary(field.type):
+            array = pc.dictionary_encode(pa.array(values.astype(object), type=pa.string()))
+            columns.append(array.cast(field.type))
+        elif field.name == 'date':
+            columns.append(pa.array(pd.to_datetime(values), type=field.type))
+        else:
+            columns.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(columns, schema=schema())
+
+
+def _write(table: 'pa.Table', path: str):
+    # written under a dot name, which dataset readers and compact() skip, then renamed into place
+    directory, name = os.path.split(path)
+    tmp = os.path.join(directory, '.' + name)
+    pq.write_table(table, tmp, compression=COMPRESSION, use_dictionary=DICTIONARY_COLUMNS)
+    os.replace(tmp, path)
+
+
+def write_df(df: pd.DataFrame, path: str) -> int:
+    # a single file with the sink's schema, e.g. for a one-off export
+    _require_pyarrow()
+    _write(_to_table(df), path)
+    return len(df)
+
+
+class ParquetSink:
+    # Price history as a hive-partitioned Parquet dataset next to (not instead
+    # of) SQLite: <root>/category=<category>/day=<YYYY-MM-DD>/part-*.parquet.
+    # Every write_df() adds one file per day, so a run never rewrites old data
+    # and readers never lock the scraper's DB; compact() merges the small files.
+    def __init__(self, root: str, category: str) -> None:
+        _require_pyarrow()
+        self.root = root
+        self.category = category
+
+
+    def write_df(self, df: pd.DataFrame) -> int:
+        if not len(df):
+            return 0
+        days = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        stamp = datetime.now().strftime('%H%M%S')
+        for day, part in df.groupby(days.to_numpy(), sort=False):
+            directory = os.path.join(self.root, f'category={self.category}', f'day={day}')
+            os.makedirs(directory, exist_ok=True)
+            _write(_to_table(part), os.path.join(directory, f'part-{stamp}-{uuid.uuid4().hex[:8]}.parquet'))
+        return len(df)
+
+
+def dataset(root: str) -> 'ds.Dataset':
+    # ds.dataset(...).to_table(filter=...) prunes partitions by category/day
+    _require_pyarrow()
+    return ds.dataset(root, format='parquet', partitioning='hive')
+
+
+def _partitions(root: str) -> Dict[str, List[str]]:
+    partitions = {}
+    for directory, _, files in os.walk(root):
+        files = sorted(os.path.join(directory, f) for f in files if f.endswith('.parquet') and not f.startswith('.'))
+        if files:
+            partitions[directory] = files
+    return partitions
+
+
+def compact(root: str, min_files: int = COMPACT_MIN_FILES) -> int:
+    # Merges every partition with at least `min_files` files into one file
+    # sorted by (link, date). The merged file is in place before the inputs are
+    # deleted, so a concurrent reader sees rows at most twice, never zero times.
+    _require_pyarrow()
+    merged = 0
+    for directory, files in _partitions(root).items():
+        if len(files) < min_files:
+            continue
+        table = pa.concat_tables([pq.read_table(f, schema=schema()) for f in files])
+        # arrow cannot sort dictionary columns directly, so sort on the decoded keys
+        keys = pa.table({'link': table['link'].cast(pa.string()), 'date': table['date']})
+        order = pc.sort_indices(keys, sort_keys=[('link', 'ascending'), ('date', 'ascending')])
+        table = table.take(order).unify_dictionaries().combine_chunks()
+        name = f'compacted-{uuid.uuid4().hex[:8]}.parquet'
+        _write(table, os.path.join(directory, name))
+        for f in files:
+            os.remove(f)
+        merged += len(files)
+        logger.info(f'{directory}: {len(files)} files -> {name} ({table.num_rows} rows)')
+    return merged
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('root', help='Parquet dataset directory')
+    parser.add_argument('--min-files', type=int, default=COMPACT_MIN_FILES)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f'{compact(args.root, args.min_files)} files compacted')
@@ -0,0 +1,230 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Iterable, List, Optional, Union
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from lxml import etree, html
+
+
+# str, or raw page bytes (bytes/bytearray/memoryview) decoded by the parser itself
+Markup = Union[str, bytes, bytearray, memoryview]
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def buffers_supported() -> bool:
+    # lxml 6 parses straight from a memoryview; older versions need bytes
+    try:
+        html.document_fromstring(memoryview(b'<p>x</p>'))
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def as_markup(data: Markup) -> Markup:
+    if isinstance(data, memoryview) and not buffers_supported():
+        return data.tobytes()
+    return data
+
+
+def html_parser(encoding: str) -> html.HTMLParser:
+    # lxml parser objects must not be used by two threads at once, so one per thread and encoding
+    parsers = getattr(_local, 'parsers', None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    parser = parsers.get(encoding)
+    if parser is None:
+        parser = parsers[encoding] = html.HTMLParser(encoding=encoding)
+    return parser
+
+
+def parse_html(data: Markup, encoding: str = None) -> html.HtmlElement:
+    # Raw bytes go to libxml2 with the declared encoding, with no decode to a Python str in between.
+    if isinstance(data, str) or encoding is None:
+        return html.document_fromstring(as_markup(data))
+    parser = html_parser(encoding)
+    doc = html.document_fromstring(as_markup(data), parser=parser)
+    if any(error.type == etree.ErrorTypes.ERR_INVALID_ENCODING for error in parser.error_log):
+        # libxml2 stops at the first invalid byte; only such pages pay for a lenient decode
+        doc = html.document_fromstring(bytes(data).decode(encoding, errors='replace'))
+    return doc
+
+
+def _decode(data: Markup, encoding: str = None) -> Union[str, bytes]:
+    # bs4 builds a str anyway; decoding here keeps one bad byte from turning the page into cp1252
+    if isinstance(data, str):
+        return data
+    if encoding is None:
+        return bytes(data)
+    return bytes(data).decode(encoding, errors='replace')
+
+
+class ParserBackend(ABC):
+    # The extractors only need a handful of lookups, so every backend exposes
+    # the same small node API and the extractor never touches the tree type.
+    @abstractmethod
+    def parse(self, data: Markup, encoding: str = None):
+        raise NotImplementedError("Not implemented")
+
+
+    @abstractmethod
+    def find(self, node, tag: str = None, cls: str = None, id: str = None):
+        raise NotImplementedError("Not implemented")
+
+
+    @abstractmethod
+    def text(self, node) -> str:
+        raise NotImplementedError("Not implemented")
+
+
+    @abstractmethod
+    def get(self, node, attr: str) -> Optional[str]:
+        raise NotImplementedError("Not implemented")
+
+
+    @abstractmethod
+    def children(self, node) -> List:
+        raise NotImplementedError("Not implemented")
+
+
+    def count_children(self, node) -> int:
+        return len(self.children(node))
+
+
+    def release(self, doc):
+        pass
+
+
+class SoupParser(ParserBackend):
+    def __init__(self, features: str = 'html.parser') -> None:
+        self.features = features
+
+
+    def parse(self, data: Markup, encoding: str = None) -> BeautifulSoup:
+        return BeautifulSoup(_decode(data, encoding), self.features)
+
+
+    def find(self, node: Tag, tag: str = None, cls: str = None, id: str = None) -> Optional[Tag]:
+        attrs = {}
+        if cls:
+            attrs['class'] = cls
+        if id:
+            attrs['id'] = id
+        return node.find(tag, attrs=attrs)
+
+
+    def text(self, node: Tag) -> str:
+        return node.text
+
+
+    def get(self, node: Tag, attr: str) -> Optional[str]:
+        return node.get(attr)
+
+
+    def children(self, node: Tag) -> List[Tag]:
+        return node.find_all(True, recursive=False)
+
+
+    def release(self, doc: BeautifulSoup):
+        doc.decompose()
+
+
+class StrainedSoupParser(SoupParser):
+    # Partial parse: only the subtrees rooted at the given classes/ids are built.
+    def __init__(self, classes: Iterable[str] = (), ids: Iterable[str] = (), features: str = 'html.parser') -> None:
+        super().__init__(features)
+        self.classes = frozenset(classes)
+        self.ids = frozenset(ids)
+        self.strainer = SoupStrainer(self._wanted)
+
+
+    def _wanted(self, name: str, attrs: dict) -> bool:
+        if attrs.get('id') in self.ids:
+            return True
+        cls = attrs.get('class') or ''
+        if isinstance(cls, str):
+            cls = cls.split()
+        return not self.classes.isdisjoint(cls)
+
+
+    def parse(self, data: Markup, encoding: str = None) -> BeautifulSoup:
+        return BeautifulSoup(_decode(data, encoding), self.features, parse_only=self.strainer)
+
+
+@lru_cache(maxsize=None)
+def _xpath(tag: str, cls: str, id: str) -> etree.XPath:
+    expr = f"descendant::{tag or '*'}"
+    if cls:
+        expr += f"[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+    if id:
+        expr += f"[@id='{id}']"
+    return etree.XPath(expr + "[1]")
+
+
+class LxmlParser(ParserBackend):
+    def parse(self, data: Markup, encoding: str = None) -> html.HtmlElement:
+        return parse_html(data, encoding)
+
+
+    def find(self, node, tag: str = None, cls: str = None, id: str = None):
+        found = _xpath(tag, cls, id)(node)
+        return found[0] if found else None
+
+
+    def text(self, node) -> str:
+        return node.text_content()
+
+
+    def get(self, node, attr: str) -> Optional[str]:
+        return node.get(attr)
+
+
+    def children(self, node) -> List:
+        return [child for child in node if isinstance(child.tag, str)]
+
+
+    def release(self, doc):
+        doc.clear()
+
+
+class JsonParser(ParserBackend):
+    # For JSON endpoints: the "tree" is the decoded document, `find` walks a
+    # dotted key path ('data.products') and items are plain dicts, so no HTML
+    # is ever built. json.loads reads utf-8 bytes without a decode step.
+    def parse(self, data: Markup, encoding: str = None):
+        if isinstance(data, str):
+            return json.loads(data)
+        if encoding is None or encoding.lower().replace('-', '') == 'utf8':
+            return json.loads(bytes(data))
+        return json.loads(bytes(data).decode(encoding, errors='replace'))
+
+
+    def find(self, node, tag: str = None, cls: str = None, id: str = None):
+        for key in (tag or '').split('.'):
+            if not key:
+                continue
+            if isinstance(node, list):
+                node = node[int(key)] if key.isdigit() and int(key) < len(node) else None
+            elif isinstance(node, dict):
+                node = node.get(key)
+            else:
+                return None
+        return node
+
+
+    def text(self, node) -> str:
+        return node if isinstance(node, str) else str(node)
+
+
+    def get(self, node, attr: str) -> Optional[str]:
+        value = self.find(node, attr)
+        return None if value is None else self.text(value)
+
+
+    def children(self, node) -> List:
+        if isinstance(node, dict):
+            return list(node.values())
+        return list(node) if isinstance(node, list) else []
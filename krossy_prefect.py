@@ -1,13 +1,18 @@
-import requests
+import time
 import httpx
-import sqlite3
 import pandas as pd
 from pprint import pprint
-from bs4 import BeautifulSoup, Tag
-from typing import Tuple
+from typing import List, Optional, Tuple
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timedelta
 from prefect import task, flow, get_run_logger
+from prefect.task_runners import ConcurrentTaskRunner
+from prefect.utilities.hashing import hash_objects
+
+from krossy_metrics import metrics
+from krossy_rows import RowBuffer
+from krossy_spec import BOOTS
+from krossy_storage import Storage
 
 
 class Schemes:
@@ -15,6 +20,23 @@ class Schemes:
     OUT = RAW + ["date", "price_us"]
 
 
+PAGES_PER_TASK = 10
+# this many consecutive pages without products end a page range early
+EMPTY_PAGES_STOP = 2
+# a page is tried this many more times within its range before it is skipped
+PAGE_RETRIES = 2
+PAGE_RETRY_DELAY = 2.0
+CACHE_EXPIRATION = timedelta(hours=1)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:78.0)   Gecko/20100101 Firefox/78.0",
+    "Accept": "*/*",
+    "Referer": "https://megasport.ua",
+}
+
+# one keep-alive pool shared by the task runner's threads
+http = httpx.Client(headers=HEADERS, follow_redirects=True, timeout=30.0)
+
+
 class NoItemsError(Exception):
     pass
 
@@ -25,174 +47,161 @@ class EmptyDfError(Exception):
 
 class ExtractItems(ABC):
     @abstractmethod
-    def get_items(self):
+    def get_first_page(self):
         raise NotImplementedError("Not implemented")
-    
 
-    @abstractmethod
-    def get_pages_count(self):
-        raise NotImplementedError("Not implemented")
-    
 
     @abstractmethod
-    def get_items(self):
+    def get_rows_by_page(self):
         raise NotImplementedError("Not implemented")
 
 
-    @abstractmethod
-    def get_name(self):
-        raise NotImplementedError("Not implemented")
-    
-
-    @abstractmethod
-    def get_price_current(self):
-        raise NotImplementedError("Not implemented")
-
-
-    @abstractmethod
-    def get_items_link(self):
-        raise NotImplementedError("Not implemented")
-    
-
-    @abstractmethod
-    def get_items_by_page(self):
-        raise NotImplementedError("Not implemented")
-
-@task
-def get_bs_by_url(url: str) -> BeautifulSoup:
-    logger = get_run_logger()
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:78.0)   Gecko/20100101 Firefox/78.0",
-        "Accept": "*/*",
-        "Referer": "https://megasport.ua",
-    }
+def get_page(url: str) -> bytes:
     try:
-        response = requests.get(url, headers=headers)
-        response.encoding = 'utf-8'
-        txt = response.text
-    except:
-        logger.error("Error with response. Check internet connection or url")
-        raise NoItemsError
-    return BeautifulSoup(txt, 'html.parser')
+        with metrics.timer('fetch'):
+            response = http.get(url)
+        metrics.incr('http_responses', status=response.status_code)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise NoItemsError(f"Error with response. Check internet connection or url: {e}")
+    metrics.incr('pages_fetched')
+    metrics.incr('bytes_fetched', len(response.content))
+    return response.content
 
 
 class ExtractBootsMaleItems(ExtractItems):
-    def get_items(self, sp: BeautifulSoup) -> Tag:
-        items = sp.find('div', class_='Fkfp3V')
-        return items if items else [None]
-    
+    spec = BOOTS.compile()
+    # read rows from the spec's embedded JSON when it matches the grid
+    embedded = False
 
-    def get_pages_count(self, sp: BeautifulSoup) -> int:
-        try:
-            return len(sp.find(id='select-page'))
-        except Exception:
-            return None
-        
+    def _rows(self, doc, host: str) -> List[tuple]:
+        # all fields of an item in one pass over its subtree, see krossy_spec
+        with metrics.timer('extract'):
+            rows = self.spec.rows(doc, lambda link: host + link)
+        metrics.incr('items_extracted', len(rows))
+        return rows
 
-    def get_name(self, item: Tag) -> str:
-        try:
-            name = item.find('div', class_='ihuxuw').text
-            name = name.replace("\u2009", " ").replace("\xa0", " ")
-            return str(name)
-        except Exception:
-            return None
 
+    def get_rows_by_page(self, page_url: str, host: str) -> List[tuple]:
+        return self.spec.rows_from_body(get_page(page_url), join_url=lambda link: host + link, embedded=self.embedded)
 
-    def get_price_current(self, item: Tag) -> Tuple[int, str]:
-        try:
-            price = item.find('span', class_='MeSmTt').text
-            price, current = price.split("\u2009")
-            price = int(price.replace("\xa0", ""))
 
-            return price, current
-        except Exception:
-            return None, None
+    def get_first_page(self, page_url: str, host: str) -> Tuple[Optional[int], List[tuple]]:
+        # the page count and the rows of page 1 from a single fetch and parse
+        content = get_page(page_url)
+        with metrics.timer('parse'):
+            doc = self.spec.parse(content)
+        count = self.spec.pages_count(doc)
+        rows = self._rows(doc, host)
+        doc.clear()
+        return count, rows
 
 
-    def get_items_link(self, item: Tag) -> str:
-        try:
-            tag = item.find('a', class_='it25hX')
-            return tag.get('href')
-        except Exception:
-            return None
-        
+def page_key(context, parameters: dict) -> str:
+    # Keyed by the extractor's class name, the settings that change its rows
+    # and the plain parameters only. Hashing the extractor itself
+    # (task_input_hash) falls back to cloudpickle, which fails on its compiled
+    # spec when the flow runs as __main__ and silently turns caching off.
+    extractor = parameters['ExtractObj']
+    config = {'embedded': getattr(extractor, 'embedded', False)}
+    plain = {name: value for name, value in parameters.items() if name != 'ExtractObj'}
+    return hash_objects(context.task.task_key, context.task.fn.__code__.co_code.hex(), type(extractor).__qualname__, config, plain)
 
-    def get_items_by_page(self, page_url: str):
-        sp = get_bs_by_url(page_url)
-        items = self.get_items(sp)
-        return items
 
+@task(cache_key_fn=page_key, cache_expiration=CACHE_EXPIRATION, persist_result=True, retries=2, retry_delay_seconds=5)
+def get_first_page(host: str, path: str, ExtractObj: ExtractItems) -> Tuple[Optional[int], List[tuple]]:
+    return ExtractObj.get_first_page(host + path + "page-1/", host)
 
-@task
-def get_items_by_page(url: str, ServeCls):
-    items = ServeCls.get_items_by_page(url)
-    return items
 
+def get_rows_by_page(page_url: str, host: str, ExtractObj: ExtractItems) -> Optional[List[tuple]]:
+    # A page is retried on its own; one that still fails is skipped (None)
+    # instead of failing, and refetching, its whole range.
+    for attempt in range(PAGE_RETRIES + 1):
+        try:
+            return ExtractObj.get_rows_by_page(page_url, host)
+        except NoItemsError as e:
+            error = e
+        if attempt < PAGE_RETRIES:
+            time.sleep(PAGE_RETRY_DELAY * 2 ** attempt)
+    get_run_logger().error(f'Skipping page {page_url}: {error}')
+    metrics.incr('pages_failed')
+    return None
+
+
+@task(cache_key_fn=page_key, cache_expiration=CACHE_EXPIRATION, persist_result=True, retries=2, retry_delay_seconds=5)
+def get_rows_by_pages(host: str, path: str, start: int, stop: int, ExtractObj: ExtractItems) -> Tuple[List[tuple], List[str]]:
+    # One task per page range; returns plain (name, price_ua, link) tuples,
+    # which are cheap to persist, so a rerun within CACHE_EXPIRATION reuses them,
+    # and the urls of the pages that failed after retries.
+    rows, failed, empty = [], [], 0
+    for i in range(start, stop):
+        page_url = host + path + f"page-{i}/"
+        page_rows = get_rows_by_page(page_url, host, ExtractObj)
+        if page_rows is None:
+            failed.append(page_url)
+            continue
+        rows.extend(page_rows)
+        empty = 0 if page_rows else empty + 1
+        if empty >= EMPTY_PAGES_STOP:
+            break
+    return rows, failed
 
-@task
-def to_df(items: list, host: str, ExtractObj: ExtractItems) -> pd.DataFrame:
-    df = pd.DataFrame(columns=Schemes.RAW)
-
-    for item in items:
-        name = ExtractObj.get_name(item=item)
-        price, _ = ExtractObj.get_price_current(item=item)
-        link = ExtractObj.get_items_link(item)
-        res = {
-            "name": name,
-            "price_ua": price,
-            "link": host + link if link else None,
-        }
-
-        df = pd.concat([df, pd.DataFrame([res])])
 
-    return df
+@task
+def to_df(rows: List[tuple]) -> pd.DataFrame:
+    buffer = RowBuffer(Schemes.RAW, int_columns=('price_ua',))
+    for row in rows:
+        buffer.append_values(*row)
+    return buffer.to_dataframe()
 
 
-@task
-def extract(host: str, path: str, ExtractObj: ExtractItems) -> list:
+def extract(host: str, path: str, ExtractObj: ExtractItems, pages_per_task: int = PAGES_PER_TASK) -> pd.DataFrame:
     logger = get_run_logger()
     logger.info('Start extracting ...')
-    url = host + path
-    sp = get_bs_by_url(url)
-    count = ExtractObj.get_pages_count(sp)
+    # page 1 is fetched once, for the page count and its own rows
+    count, rows = get_first_page(host, path, ExtractObj)
     if not count:
         count = 1
-    #count = 2
-    futures = []
-    for i in range(1, count):
-        path = path + f"page-{i}/"
-        url = host + path
-        futures.append(get_items_by_page.submit(url, ExtractObj))
-    
-    items = []
-    for future in futures:
-        for item in future.result():
-            if item:
-                items.append(item) 
 
-    if not len(items):
+    futures = [
+        get_rows_by_pages.submit(host, path, start, min(start + pages_per_task, count + 1), ExtractObj)
+        for start in range(2, count + 1, pages_per_task)
+    ]
+    # results are collected per range, so a range that failed does not throw away the others
+    failed = []
+    for future in futures:
+        result = future.result(raise_on_failure=False)
+        if isinstance(result, Exception):
+            logger.error(f'Page range failed: {result!r}')
+            continue
+        range_rows, range_failed = result
+        rows = rows + range_rows
+        failed.extend(range_failed)
+    if failed:
+        logger.warning(f'Pages failed after retries: {len(failed)}')
+
+    if not len(rows):
         logger.error("Cant get items. Check the implementation of get_items method")
         raise NoItemsError
 
-    df = to_df(items=items, host=host, ExtractObj=ExtractObj)
+    df = to_df(rows=rows)
 
     logger.info(f'Count of extracting items is: {len(df)}')
     return df
 
 
 class ClientDB:
-    def __init__(self, db: str) -> None:
+    def __init__(self, db: str, table: str = 'krossy_table') -> None:
         self.db = db
-        self.con = sqlite3.connect(self.db)
-        self.cursor = self.con.cursor()
+        self.storage = Storage(self.db, view=table)
+        self.con = self.storage.con
     
-    def write_df_to_db(self, df: pd.DataFrame, table: str):
-        df.to_sql(name=table, con=self.con, if_exists = 'append', chunksize = 1000)
+    def write_df_to_db(self, df: pd.DataFrame):
+        return self.storage.write_df(df)
 
 
     def request(self, req: str):
-        response = self.cursor.execute(req)
-        return response.fetchall()
+        return self.storage.query(req)
 
 
 @task
@@ -209,41 +218,45 @@ def drop_none(df: pd.DataFrame):
 @task
 def add_another_current(df: pd.DataFrame):
     course = 35
-    df.loc[:, 'price_us'] = df.loc[:, 'price_ua'].apply(lambda x: round(x / course, 2))
+    df['price_ua'] = df['price_ua'].astype('Int32')
+    df['price_us'] = (df['price_ua'] / course).round(2)
 
 
 @task
 def add_data_time(df: pd.DataFrame):
-    df.loc[:, 'date'] = datetime.now()
+    df['date'] = pd.Timestamp(datetime.now())
 
 
 @task
 def transform(extract_df: pd.DataFrame):
-    df = pd.DataFrame(columns=Schemes.OUT)
     extract_df = extract_df.copy()
-    drop_none(extract_df)
-    add_another_current(extract_df)
-    add_data_time(extract_df)
-    return pd.concat([df, extract_df])
+    with metrics.timer('transform'):
+        drop_none(extract_df)
+        add_another_current(extract_df)
+        add_data_time(extract_df)
+    return extract_df[Schemes.RAW + ['date', 'price_us']]
 
 
 @task
 def load_to_db(df_to_load: pd.DataFrame, db_path: str, db_table: str):
     logger = get_run_logger()
-    db = ClientDB(db=db_path)
+    db = ClientDB(db=db_path, table=db_table)
     try:
-        db.write_df_to_db(df=df_to_load, table=db_table)
+        db.write_df_to_db(df=df_to_load)
         return len(df_to_load)
     except Exception:
         logger.error("Trouble to connect to db")
         return None
 
 
-@flow
-def etl_flow(host: str, path:str, db_path, db_table):
+@flow(task_runner=ConcurrentTaskRunner())
+def etl_flow(host: str, path:str, db_path, db_table, metrics_path: Optional[str] = None, embedded: bool = False):
+    # Cached page ranges are not refetched, so their fetch/parse stages do not show up in the metrics.
     logger = get_run_logger()
+    metrics.reset()
     try:
         ExtractObj = ExtractBootsMaleItems()
+        ExtractObj.embedded = embedded
         extract_df = extract(host=host, path=path, ExtractObj=ExtractObj)
         transform_df = transform(extract_df=extract_df)
         count = load_to_db(df_to_load=transform_df, db_path=db_path, db_table=db_table)
@@ -251,6 +264,8 @@ def etl_flow(host: str, path:str, db_path, db_table):
             logger.info(f'It has been written {count} items to {db_path} in {db_table} table')
     except Exception as e:
         logger.error(e, "Something went wrong")
+    if metrics_path:
+        metrics.write(metrics_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+import cProfile
+import glob
+import io
+import json
+import logging
+import multiprocessing.util
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+
+logger = logging.getLogger()
+
+
+INTERVAL = 0.005
+TOP = 25
+ENGINES = ('sample', 'cprofile', 'pyinstrument')
+STDLIB = sysconfig.get_paths()['stdlib']
+# leaf frames of threads that are only waiting (event loop, pool queues, locks)
+IDLE_FUNCTIONS = frozenset((
+    'select', 'poll', 'wait', 'get', 'acquire', '_wait_for_tstate_lock', 'accept',
+    'readinto', 'recv_into', 'recv_bytes', '_recv', '_send',
+))
+
+Stack = Tuple[str, ...]
+
+
+class ProfileError(Exception):
+    pass
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_name in IDLE_FUNCTIONS and frame.f_code.co_filename.startswith(STDLIB)
+
+
+class Profiler:
+    # Wall-clock sampling profiler: a daemon thread reads every thread's stack
+    # (sys._current_frames) each `interval` seconds, so the fetch loop thread,
+    # DB threads and the main thread all show up. Stacks are kept collapsed
+    # ("thread;outer;...;leaf" -> samples), which is what flamegraph.pl and
+    # speedscope import. Parse workers run their own Profiler, see worker_initializer.
+    def __init__(self, interval: float = INTERVAL, label: str = None) -> None:
+        self.interval = interval
+        self.label = label
+        self.samples: Counter = Counter()
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+
+    def start(self) -> 'Profiler':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='krossy-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if _is_idle(frame):
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(self.label or names.get(ident, str(ident)))
+                self.samples[tuple(reversed(stack))] += 1
+
+
+    def folded(self) -> str:
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+
+    def merge_folded(self, text: str):
+        for line in text.splitlines():
+            stack, _, count = line.rpartition(' ')
+            if stack:
+                self.samples[tuple(stack.split(';'))] += int(count)
+
+
+    def speedscope(self, name: str = 'krossy') -> dict:
+        frames, index, samples, weights = [], {}, [], []
+        for stack, count in self.samples.items():
+            ids = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append({'name': label})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled', 'name': name, 'unit': 'seconds',
+                'startValue': 0, 'endValue': sum(weights), 'samples': samples, 'weights': weights,
+            }],
+        }
+
+
+    def write(self, path: str):
+        # *.json -> speedscope, anything else -> collapsed stacks (flamegraph.pl, speedscope, inferno)
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.speedscope(os.path.basename(path)), f)
+            else:
+                f.write(self.folded())
+
+
+    def top(self, n: int = TOP) -> Tuple[Counter, Counter]:
+        own, total = Counter(), Counter()
+        for stack, count in self.samples.items():
+            # stack[0] is the thread/worker label
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        return Counter(dict(own.most_common(n))), Counter(dict(total.most_common(n)))
+
+
+    def report(self, n: int = TOP) -> str:
+        busy = sum(self.samples.values())
+        if not busy:
+            return 'no samples'
+        own, total = self.top(n)
+        lines = [f'{busy} busy samples ({busy * self.interval:.2f}s), {self.idle} idle samples not shown']
+        for title, counter in (('self', own), ('total', total)):
+            lines.append(f'top {n} by {title} time:')
+            lines.extend(f'{count / busy:7.1%} {count * self.interval:8.2f}s  {label}' for label, count in counter.most_common())
+        return '\n'.join(lines)
+
+
+    def collect_workers(self, prefix: str):
+        for path in glob.glob(f'{prefix}.worker-*'):
+            with open(path) as f:
+                self.merge_folded(f.read())
+            os.remove(path)
+
+
+_worker_profiler: Optional[Profiler] = None
+
+
+def worker_initializer(prefix: str, interval: float = INTERVAL):
+    # ProcessPoolExecutor initializer: the worker samples itself and writes its
+    # collapsed stacks next to the parent's output when the pool shuts it down.
+    global _worker_profiler
+    _worker_profiler = Profiler(interval, label=f'parse-worker-{os.getpid()}').start()
+    multiprocessing.util.Finalize(_worker_profiler, _dump_worker, args=(prefix,), exitpriority=10)
+
+
+def _dump_worker(prefix: str):
+    _worker_profiler.stop()
+    with open(f'{prefix}.worker-{os.getpid()}', 'w') as f:
+        f.write(_worker_profiler.folded())
+
+
+@contextmanager
+def profiling(path: str, engine: str = 'sample', top: int = TOP, interval: float = INTERVAL) -> Iterator[Dict]:
+    # Profiles the block and writes `path` plus a top-N report to the log.
+    # Yields the ProcessPoolExecutor kwargs that make parse workers profile
+    # themselves ({} for engines that only see the calling thread).
+    if engine not in ENGINES:
+        raise ProfileError(f'Unknown profiler: {engine}')
+    start = time.perf_counter()
+
+    if engine == 'sample':
+        profiler = Profiler(interval).start()
+        try:
+            yield {'initializer': worker_initializer, 'initargs': (path, interval)}
+        finally:
+            profiler.stop()
+            profiler.collect_workers(path)
+            profiler.write(path)
+            report = profiler.report(top)
+
+    elif engine == 'cprofile':
+        # deterministic, but only the calling thread
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield {}
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            stats = pstats.Stats(profiler, stream=out)
+            stats.sort_stats('tottime').print_stats(top)
+            stats.sort_stats('cumulative').print_stats(top)
+            report = out.getvalue()
+
+    else:
+        try:
+            import pyinstrument
+            from pyinstrument.renderers import SpeedscopeRenderer
+        except ImportError:
+            raise ProfileError('pyinstrument is not installed')
+        profiler = pyinstrument.Profiler(interval=interval, async_mode='disabled')
+        profiler.start()
+        try:
+            yield {}
+        finally:
+            profiler.stop()
+            with open(path, 'w') as f:
+                f.write(profiler.output(SpeedscopeRenderer()) if path.endswith('.json') else profiler.output_html())
+            report = profiler.output_text()
+
+    logger.info(f'Profile of {time.perf_counter() - start:.1f}s written to {path}\n{report}')
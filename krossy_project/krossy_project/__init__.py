@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The shared krossy_* modules live in the repository root, two levels up.
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
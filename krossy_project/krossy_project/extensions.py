@@ -0,0 +1,41 @@
+# Profiles a crawl when KROSSY_PROFILE_OUTPUT is set:
+#
+#     scrapy crawl boots -s KROSSY_PROFILE_OUTPUT=boots.speedscope.json [-s KROSSY_PROFILER=cprofile]
+#
+# See https://docs.scrapy.org/en/latest/topics/extensions.html
+
+from contextlib import ExitStack
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from krossy_profile import TOP, profiling
+
+
+class ProfileExtension:
+    # Unlike `scrapy crawl --profile` (cProfile of the reactor thread only), the
+    # default sampling profiler also covers the pipeline's DB write threads.
+    def __init__(self, path: str, engine: str = 'sample', top: int = TOP) -> None:
+        self.path = path
+        self.engine = engine
+        self.top = top
+        self.stack = ExitStack()
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('KROSSY_PROFILE_OUTPUT')
+        if not path:
+            raise NotConfigured
+        ext = cls(path, crawler.settings.get('KROSSY_PROFILER', 'sample'), crawler.settings.getint('KROSSY_PROFILE_TOP', TOP))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+
+    def spider_opened(self, spider):
+        self.stack.enter_context(profiling(self.path, engine=self.engine, top=self.top))
+
+
+    def spider_closed(self, spider):
+        self.stack.close()
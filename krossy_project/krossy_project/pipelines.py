@@ -7,11 +7,17 @@
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 from scrapy.exceptions import DropItem
+from twisted.internet import task, threads
+from twisted.internet.defer import Deferred, DeferredList
 from datetime import datetime
 import pandas as pd
 import logging
-import sqlite3
 import os
+from collections import deque
+
+from krossy_metrics import metrics
+from krossy_rows import RowBuffer
+from krossy_storage import Storage
 
 
 # logger = logging.getLogger()
@@ -24,48 +30,111 @@ class Schemes:
 
 
 class ClientDB:
-    def __init__(self, db: str) -> None:
+    def __init__(self, db: str, table: str = 'krossy_table') -> None:
         self.db = db
-        self.con = sqlite3.connect(self.db)
-        self.cursor = self.con.cursor()
+        self.storage = Storage(self.db, view=table)
+        self.con = self.storage.con
     
-    def write_df_to_db(self, df: pd.DataFrame, table: str):
-        df.to_sql(name=table, con=self.con, if_exists = 'append', chunksize = 1000)
+    def write_df_to_db(self, df: pd.DataFrame):
+        return self.storage.write_df(df)
 
 
     def request(self, req: str):
-        response = self.cursor.execute(req)
-        return response.fetchall()
+        return self.storage.query(req)
     
 
 class BootsPipeline:
-    def process_item(self, item, spider):
-        print('we are in 1 pipilne')
-        adapter = ItemAdapter(item)
+    # Items are buffered and written every KROSSY_BATCH_SIZE items or
+    # KROSSY_FLUSH_INTERVAL seconds on a reactor thread-pool thread, so the
+    # reactor never blocks on SQLite and a crash loses at most one batch.
+    # While more than MAX_PENDING_WRITES batches are queued, process_item waits.
+    course = 35
+    MAX_PENDING_WRITES = 2
+
+    def __init__(self, db: str, batch_size: int = 500, flush_interval: float = 10.0, metrics_path: str = None, stats=None) -> None:
+        self.db_path = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics_path = metrics_path
+        self.stats = stats
+
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            db=settings.get('KROSSY_DB') or os.path.join(os.getcwd(), '../..', 'krossy.db'),
+            batch_size=settings.getint('KROSSY_BATCH_SIZE', 500),
+            flush_interval=settings.getfloat('KROSSY_FLUSH_INTERVAL', 10.0),
+            metrics_path=settings.get('KROSSY_METRICS'),
+            stats=crawler.stats,
+        )
 
-        if adapter['price_ua']:
-            course = 35
-            adapter['price_us'] = round(adapter['price_ua'] / 2, 2)
 
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
         adapter['date'] = datetime.now()
-        
-        self.df = pd.concat([self.df, pd.DataFrame([adapter.asdict()])])
+        self.rows.append(adapter.asdict())
+
+        if len(self.rows) >= self.batch_size:
+            self._flush(spider)
+            if len(self.pending) > self.MAX_PENDING_WRITES:
+                # backpressure: let the oldest write finish before taking more items
+                d = Deferred()
+                self.pending[0].addBoth(lambda _: d.callback(item))
+                return d
         return item
 
 
     def open_spider(self, spider):
-        self.df = pd.DataFrame(columns=Schemes.OUT)
- 
+        self.rows = RowBuffer(Schemes.OUT, int_columns=('price_ua',))
+        self.db = ClientDB(db=self.db_path, table='krossy_table')
+        # in submission order, so pending[0] is the oldest write
+        self.pending = deque()
+        self.written = 0
+        self.timer = task.LoopingCall(self._flush, spider)
+        self.timer.start(self.flush_interval, now=False)
+        metrics.reset()
+
+
+    def _write(self, rows: RowBuffer) -> int:
+        df = rows.flush()
+        df['price_us'] = (df['price_ua'] / self.course).round(2)
+        return self.db.write_df_to_db(df=df)
+
+
+    def _written(self, count: int, spider):
+        self.written += count
+        spider.logger.info(f'It has been written {count} items to db ({self.written} in total)')
+
+
+    def _flush(self, spider):
+        if not len(self.rows):
+            return
+        rows, self.rows = self.rows, RowBuffer(Schemes.OUT, int_columns=('price_ua',))
+        d = threads.deferToThread(self._write, rows)
+        d.addCallback(self._written, spider)
+        d.addErrback(lambda failure: spider.logger.error(f'Error with writing items to db: {failure.value!r}'))
+        self.pending.append(d)
+        d.addBoth(lambda _: self.pending.remove(d))
+
+
+    def _write_metrics(self):
+        # Fetching and parsing happen inside Scrapy, so those numbers come from its stats collector.
+        if self.stats is not None:
+            stats = self.stats.get_stats()
+            metrics.incr('pages_fetched', stats.get('response_received_count', 0))
+            metrics.incr('bytes_fetched', stats.get('downloader/response_bytes', 0))
+            metrics.incr('retries', stats.get('retry/count', 0))
+            metrics.incr('items_extracted', stats.get('item_scraped_count', 0))
+        metrics.write(self.metrics_path)
+
 
     def close_spider(self, spider):
-        print('Number of rows:', len(self.df))
-        print(f'Number of rows with None: {self.df.isnull().any(axis=1).sum()}')
-        
-        name_db = 'krossy.db'
-        path_db = os.path.join(os.getcwd(), '../..', name_db)
-        try:
-            db = ClientDB(db=path_db)
-            db.write_df_to_db(df=self.df, table='krossy_table')
-            print(f'It has been written {len(self.df)} items to db')
-        except Exception:
-            print('Error with writing items to db!')
\ No newline at end of file
+        if self.timer.running:
+            self.timer.stop()
+        self._flush(spider)
+        d = DeferredList(list(self.pending))
+        if self.metrics_path:
+            d.addCallback(lambda _: self._write_metrics())
+        return d.addCallback(lambda _: self.db.storage.close())
@@ -7,6 +7,8 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
 BOT_NAME = "krossy_project"
 
 SPIDER_MODULES = ["krossy_project.spiders"]
@@ -56,9 +58,10 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "krossy_project.extensions.ProfileExtension": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -87,6 +90,35 @@ ITEM_PIPELINES = {
 #HTTPCACHE_IGNORE_HTTP_CODES = []
 #HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
 
+# High-throughput profile for whole-category crawls:
+#     KROSSY_SCRAPY_PROFILE=fast scrapy crawl boots
+# BootSpider schedules every page of a category at once, so concurrency is
+# bounded here and AutoThrottle adapts it to the server's latency.
+if os.environ.get("KROSSY_SCRAPY_PROFILE") == "fast":
+    CONCURRENT_REQUESTS = 64
+    CONCURRENT_REQUESTS_PER_DOMAIN = 32
+    DOWNLOAD_DELAY = 0
+    DOWNLOAD_TIMEOUT = 30
+    COOKIES_ENABLED = False
+    TELNETCONSOLE_ENABLED = False
+    REACTOR_THREADPOOL_MAXSIZE = 20
+    DNSCACHE_ENABLED = True
+    DNSCACHE_SIZE = 10000
+    RETRY_TIMES = 3
+    RETRY_HTTP_CODES = [429, 500, 502, 503, 504, 522, 524, 408]
+
+    AUTOTHROTTLE_ENABLED = True
+    AUTOTHROTTLE_START_DELAY = 0.25
+    AUTOTHROTTLE_MAX_DELAY = 10
+    AUTOTHROTTLE_TARGET_CONCURRENCY = 16.0
+
+    HTTPCACHE_ENABLED = True
+    HTTPCACHE_EXPIRATION_SECS = 3600
+    HTTPCACHE_DIR = "httpcache"
+    HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
+    HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+    HTTPCACHE_GZIP = True
+
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
@@ -1,51 +1,57 @@
 import scrapy
 from ..items import BootsItem
+from krossy_spec import BOOTS
 
 #to run being in project dir: scrapy crawl boots
 
 class BootSpider(scrapy.Spider):
     name = 'boots'
+    # the same compiled extractor as krossy.py and krossy_prefect.py, run on parsel's lxml tree
+    spec = BOOTS.compile()
+    # -a embedded=1: rows from the page's embedded product JSON when it matches the grid
+    embedded = False
 
     start_urls = ['https://megasport.ua/ua/catalog/krossovki-i-snikersi/male/']
 
+    def __init__(self, start_url: str = None, embedded: str = None, *args, **kwargs):
+        # scrapy crawl boots -a start_url=... to crawl another category
+        super().__init__(*args, **kwargs)
+        if start_url:
+            self.start_urls = [start_url]
+        if embedded is not None:
+            self.embedded = embedded.lower() not in ('0', 'false', 'no')
+
     # def start_requests(self):
     #     urls = ['https://megasport.ua/ua/catalog/krossovki-i-snikersi/male/']
     #     for url in urls:
     #         yield scrapy.Request(url=url, callback=self.parse)
 
-    def _get_name(self, item) -> str:
-        name = item.css('div.ihuxuw::text').getall()
-        name = "".join(name).replace("\u2009", " ").replace("\xa0", " ")
-        return name if name else None
-    
-
-    def _get_price(self, item):
-        price_current = "".join(item.css('span.MeSmTt::text').getall())
-        if price_current:
-            price, current = price_current.split("\u2009")
-            price = int(price.replace("\xa0", ""))
-        else:
-            price = None
-
-        return price
-    
-
-    def _get_link(self, item):
-        return item.css('a.it25hX::attr(href)').get()
+    def _get_pages_count(self, response) -> int:
+        return self.spec.pages_count(response.selector.root)
 
 
     def parse(self, response):
-        boots_items = BootsItem()
-        items = response.css("div.Fkfp3V div.Z7K92d")
-        for item in items:
-            boots_items['name'] = self._get_name(item)
-            boots_items['price_ua'] = self._get_price(item)
-            boots_items['link'] = response.urljoin(self._get_link(item))
-            yield boots_items
+        # First page: read the page count from select-page and schedule every
+        # other page at once instead of walking the "next page" links.
+        yield from self.parse_items(response)
 
+        pages = self._get_pages_count(response)
+        if pages:
+            for i in range(2, pages + 1):
+                yield scrapy.Request(url=response.urljoin(f"page-{i}/"), callback=self.parse_items)
+            return
 
         pagination = response.css('div.pfK9C7')
-        next_page_path = pagination[0].css('[data-test-id="nextPage"]::attr(href)').get()
-        if next_page_path:  
+        next_page_path = pagination[0].css('[data-test-id="nextPage"]::attr(href)').get() if pagination else None
+        if next_page_path:
             url = response.urljoin(next_page_path)
-            #yield scrapy.Request(url=url, callback=self.parse)
\ No newline at end of file
+            yield scrapy.Request(url=url, callback=self.parse)
+
+
+    def parse_items(self, response):
+        # the embedded path reads response.body, so parsel never builds the page tree
+        rows = self.spec.embedded_rows(response.body, response.encoding, response.urljoin) if self.embedded else None
+        if rows is None:
+            rows = self.spec.rows(response.selector.root, response.urljoin)
+        for row in rows:
+            yield BootsItem(zip(self.spec.columns, row))
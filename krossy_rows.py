@@ -0,0 +1,73 @@
+from array import array
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class RowBuffer:
+    # Column-wise accumulator: integer columns live in array('q') plus a null
+    # mask, everything else in plain lists. The DataFrame is built once per
+    # to_dataframe()/flush() instead of once per item.
+    __slots__ = ("columns", "int_columns", "_values", "_masks", "_size")
+
+    def __init__(self, columns: Sequence[str], int_columns: Iterable[str] = ()) -> None:
+        self.columns = list(columns)
+        self.int_columns = frozenset(int_columns)
+        self._clear()
+
+
+    def _clear(self):
+        self._values = {
+            col: array('q') if col in self.int_columns else []
+            for col in self.columns
+        }
+        self._masks = {col: bytearray() for col in self.int_columns}
+        self._size = 0
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def append_values(self, *values):
+        for col, value in zip(self.columns, values):
+            if col in self.int_columns:
+                self._values[col].append(0 if value is None else value)
+                self._masks[col].append(value is None)
+            else:
+                self._values[col].append(value)
+        self._size += 1
+
+
+    def append(self, row):
+        if isinstance(row, tuple):
+            self.append_values(*row)
+        elif isinstance(row, Mapping):
+            self.append_values(*(row.get(col) for col in self.columns))
+        else:
+            self.append_values(*(getattr(row, col, None) for col in self.columns))
+
+
+    def extend(self, rows: Iterable):
+        for row in rows:
+            self.append(row)
+
+
+    def to_dataframe(self) -> pd.DataFrame:
+        data = {}
+        for col in self.columns:
+            values = self._values[col]
+            if col in self.int_columns:
+                ints = np.frombuffer(values, dtype=np.int64) if len(values) else np.empty(0, dtype=np.int64)
+                mask = np.frombuffer(self._masks[col], dtype=np.bool_) if len(values) else np.empty(0, dtype=np.bool_)
+                data[col] = pd.arrays.IntegerArray(ints.copy(), mask.copy())
+            else:
+                data[col] = values
+        return pd.DataFrame(data, columns=self.columns)
+
+
+    def flush(self) -> pd.DataFrame:
+        df = self.to_dataframe()
+        self._clear()
+        return df
@@ -0,0 +1,149 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+import krossy
+from krossy import ClientDB, ClientWeb, ExtractItems, IncrementalState, Transform, make_parse_pool, stream_etl
+from krossy_cache import ResponseCache
+from krossy_metrics import metrics
+
+
+logger = logging.getLogger()
+
+
+class ConfigError(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("extractor", "host", "path")
+
+    def __init__(self, extractor: type, host: str, path: str) -> None:
+        self.extractor = extractor
+        self.host = host
+        self.path = path
+
+
+    def __repr__(self) -> str:
+        return f'{self.extractor.__name__}({self.host}{self.path})'
+
+
+def _extractor_cls(name: str) -> type:
+    cls = getattr(krossy, name, None)
+    if not isinstance(cls, type) or not issubclass(cls, ExtractItems):
+        raise ConfigError(f'Unknown extractor: {name}')
+    return cls
+
+
+def load_config(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    try:
+        # without an "extractor" key the job uses the extractor registered for its host
+        config['jobs'] = [
+            Job(_extractor_cls(job['extractor']) if 'extractor' in job else krossy.extractor_for(job['host']), job['host'], job['path'])
+            for job in config['jobs']
+        ]
+    except KeyError as e:
+        raise ConfigError(f'Missing key in {path}: {e}')
+    except krossy.UnknownSiteError as e:
+        raise ConfigError(f'{path}: {e}')
+    return config
+
+
+class Scheduler:
+    # Runs every job on one shared ClientWeb, so `concurrency` is the global
+    # request budget and `per_host`/`host_limits` the per-host budgets across
+    # all jobs. Each job streams its batches into the shared DB.
+    def __init__(
+        self,
+        jobs: List[Job],
+        db: str = 'krossy.db',
+        concurrency: int = krossy.MAX_CONCURRENCY,
+        per_host: int = krossy.MAX_PER_HOST,
+        host_limits: Dict[str, int] = None,
+        parallel_jobs: int = None,
+        incremental: bool = False,
+        cache: str = None,
+        replay: bool = False,
+        parse_workers: int = 0,
+        rate: float = None,
+        host_rates: Dict[str, float] = None,
+        parquet: str = None,
+        changes_log: str = None,
+    ) -> None:
+        if replay and not cache:
+            raise ConfigError('replay needs a cache file')
+        self.jobs = jobs
+        self.parquet = parquet
+        self.db = ClientDB(db=db)
+        self.client = ClientWeb(
+            concurrency=concurrency,
+            per_host=per_host,
+            host_limits=host_limits,
+            rate=rate,
+            host_rates=host_rates,
+            cache=ResponseCache(cache, replay=replay) if cache else None,
+        )
+        self.parallel_jobs = parallel_jobs or max(len(jobs), 1)
+        self.incremental = incremental
+        self.pool = make_parse_pool(parse_workers) if parse_workers else None
+        self.detector = None
+        if changes_log:
+            # one index for every job, so a product listed in two categories is compared once
+            from krossy_changes import ChangeDetector, JsonLinesListener
+            self.detector = ChangeDetector(self.db.storage, [JsonLinesListener(changes_log)])
+
+
+    def _run_job(self, job: Job) -> int:
+        extractor = job.extractor(client=self.client, host=job.host, path=job.path)
+        state = IncrementalState(self.db) if self.incremental else None
+        sink = None
+        if self.parquet:
+            from krossy_parquet import ParquetSink, category_from_path
+            sink = ParquetSink(self.parquet, category_from_path(job.path))
+        return stream_etl(extractor, Transform(), self.db, state=state, pool=self.pool, sink=sink, detector=self.detector)
+
+
+    def run(self) -> Dict[str, int]:
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.parallel_jobs) as executor:
+                futures = {executor.submit(self._run_job, job): job for job in self.jobs}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        results[repr(job)] = future.result()
+                        logger.info(f'{job}: {results[repr(job)]} items written')
+                    except Exception as e:
+                        results[repr(job)] = None
+                        logger.error(f'{job} failed: {e!r}')
+        finally:
+            self.client.close()
+            if self.pool is not None:
+                self.pool.shutdown()
+        return results
+
+
+def main(config_path: str):
+    start = time.time()
+    config = load_config(config_path)
+    jobs = config.pop('jobs')
+    metrics_path = config.pop('metrics', None)
+    metrics.reset()
+    results = Scheduler(jobs, **config).run()
+    failed = [job for job, count in results.items() if count is None]
+    logger.info(f'{len(results) - len(failed)} of {len(results)} jobs done in {time.time() - start:.1f}s')
+    if metrics_path:
+        metrics.write(metrics_path)
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', help='JSON file with the crawl jobs')
+    args = parser.parse_args()
+    main(args.config)
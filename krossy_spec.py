@@ -0,0 +1,205 @@
+import re
+from typing import Callable, List, Optional, Sequence
+
+from lxml import html
+
+from krossy_embedded import Embedded, JsonLd
+from krossy_metrics import metrics
+from krossy_parsers import Markup, _xpath, parse_html
+
+
+def clean_name(text: str) -> str:
+    return text.replace("\u2009", " ").replace("\xa0", " ")
+
+
+def parse_price(text: str) -> int:
+    # "12\xa0999\u2009₴" -> 12999
+    price, current = text.split("\u2009")
+    return int(price.replace("\xa0", ""))
+
+
+TAG_NAME = re.compile(rb'<([A-Za-z][A-Za-z0-9]*)')
+
+
+def grid_fragment(body: bytes, marker: str) -> Optional[bytes]:
+    # The raw product grid element: from the opening tag that holds `marker`
+    # to its matching closing tag, found by counting nested tags of the same
+    # name, so the footer and trailing scripts (nonces, build ids) are left out.
+    idx = body.find(marker.encode('utf-8')) if marker else -1
+    if idx < 0:
+        return None
+    start = body.rfind(b'<', 0, idx)
+    name = TAG_NAME.match(body, start) if start >= 0 else None
+    if name is None:
+        return None
+    depth = 0
+    for tag in re.compile(rb'<(/?)' + re.escape(name.group(1)) + rb'[\s>/]', re.I).finditer(body, start):
+        depth += -1 if tag.group(1) else 1
+        if not depth:
+            end = body.find(b'>', tag.end() - 1)
+            return body[start:end + 1] if end >= 0 else None
+    return None
+
+
+class Field:
+    # One value per item: the first `tag.cls` element inside the item, its
+    # text (or `attr`), passed through `parse`. A missing element or a
+    # failing `parse` gives None and counts as a selector miss.
+    __slots__ = ("name", "tag", "cls", "attr", "parse", "url")
+
+    def __init__(self, name: str, tag: str, cls: str, attr: str = None, parse: Callable = None, url: bool = False) -> None:
+        self.name = name
+        self.tag = tag
+        self.cls = cls
+        self.attr = attr
+        self.parse = parse
+        self.url = url
+
+
+class Spec:
+    # Declarative description of a catalog page: where the item grid is, the
+    # fields of each item and where the page count is read from. `embedded`
+    # reads the same (name, price, link) rows from structured data in the page,
+    # tried before the grid selectors.
+    def __init__(self, grid: Sequence[str], fields: Sequence[Field], pages_id: str = None, embedded: Embedded = None) -> None:
+        self.grid = tuple(grid)
+        self.fields = list(fields)
+        self.pages_id = pages_id
+        self.embedded = embedded
+
+
+    @property
+    def columns(self) -> List[str]:
+        return [field.name for field in self.fields]
+
+
+    def compile(self) -> 'CompiledSpec':
+        return CompiledSpec(self)
+
+
+class CompiledSpec:
+    # lxml extractor built once per spec. Each item is walked a single time
+    # (iter() filtered to the field tags) and every element is matched against
+    # all fields at once, instead of one tree search per field.
+    def __init__(self, spec: Spec) -> None:
+        self.spec = spec
+        self.fields = spec.fields
+        self.embedded = spec.embedded
+        self._grid = _xpath(spec.grid[0], spec.grid[1], None)
+        self._pages = _xpath(None, None, spec.pages_id) if spec.pages_id else None
+        self._tags = tuple({field.tag for field in self.fields})
+        # one per item card: the class of the link field (or the first field)
+        counted = next((field for field in self.fields if field.url), self.fields[0])
+        self._item_token = counted.cls.encode('utf-8')
+        self._index = {(field.tag, field.cls): i for i, field in enumerate(self.fields)}
+        self._by_name = {field.name: field for field in self.fields}
+
+
+    @property
+    def columns(self) -> List[str]:
+        return self.spec.columns
+
+
+    def field(self, name: str) -> Field:
+        return self._by_name[name]
+
+
+    def parse(self, body: Markup, encoding: str = 'utf-8') -> html.HtmlElement:
+        # the encoding is passed explicitly: pages without a charset declaration would be read as latin-1
+        return parse_html(body, encoding)
+
+
+    def items(self, doc) -> List:
+        grid = self._grid(doc)
+        return [child for child in grid[0] if isinstance(child.tag, str)] if grid else []
+
+
+    def pages_count(self, doc) -> Optional[int]:
+        found = self._pages(doc) if self._pages is not None else None
+        if not found:
+            return None
+        return sum(1 for child in found[0] if isinstance(child.tag, str))
+
+
+    def row(self, item, join_url: Callable[[str], str] = None) -> tuple:
+        nodes = [None] * len(self.fields)
+        left = len(self.fields)
+        for el in item.iter(*self._tags):
+            cls = el.get('class')
+            if not cls:
+                continue
+            for token in cls.split():
+                i = self._index.get((el.tag, token))
+                if i is not None and nodes[i] is None:
+                    nodes[i] = el
+                    left -= 1
+            if not left:
+                break
+
+        values = []
+        for field, node in zip(self.fields, nodes):
+            value = None
+            if node is not None:
+                value = node.get(field.attr) if field.attr else node.text_content()
+                if value is not None and field.parse is not None:
+                    try:
+                        value = field.parse(value)
+                    except Exception:
+                        value = None
+                if value is not None and field.url and join_url is not None:
+                    value = join_url(value)
+            if value is None:
+                metrics.incr('selector_misses', field=field.name)
+            values.append(value)
+        return tuple(values)
+
+
+    def rows(self, doc, join_url: Callable[[str], str] = None) -> List[tuple]:
+        return [self.row(item, join_url) for item in self.items(doc)]
+
+
+    def count_items(self, body: bytes) -> Optional[int]:
+        # item cards in the raw grid, without parsing; None when there is no grid
+        fragment = grid_fragment(body, self.spec.grid[1])
+        return None if fragment is None else fragment.count(self._item_token)
+
+
+    def embedded_rows(self, body: Markup, encoding: str = 'utf-8', join_url: Callable[[str], str] = None) -> Optional[List[tuple]]:
+        # None when the spec has no embedded source or the page carries no data
+        # that accounts for every item of its grid
+        if self.embedded is None:
+            return None
+        with metrics.timer('extract'):
+            if isinstance(body, str):
+                body, encoding = body.encode('utf-8'), 'utf-8'
+            elif not isinstance(body, bytes):
+                body = bytes(body)
+            return self.embedded.rows(body, encoding, join_url, expected=self.count_items(body))
+
+
+    def rows_from_body(self, body: Markup, encoding: str = 'utf-8', join_url: Callable[[str], str] = None, embedded: bool = False) -> List[tuple]:
+        # raw page in, rows out: with `embedded`, the embedded data if it matches the grid, else the grid
+        rows = self.embedded_rows(body, encoding, join_url) if embedded else None
+        if rows is None:
+            with metrics.timer('parse'):
+                doc = self.parse(body, encoding)
+            with metrics.timer('extract'):
+                rows = self.rows(doc, join_url)
+            doc.clear()
+        metrics.incr('items_extracted', len(rows))
+        return rows
+
+
+# megasport.ua catalog, in Schemes.RAW order
+BOOTS = Spec(
+    grid=('div', 'Fkfp3V'),
+    fields=[
+        Field('name', 'div', 'ihuxuw', parse=clean_name),
+        Field('price_ua', 'span', 'MeSmTt', parse=parse_price),
+        Field('link', 'a', 'it25hX', attr='href', url=True),
+    ],
+    pages_id='select-page',
+    # schema.org product data, when the catalog renders it; only used by
+    # extractors that opt in, as the site's markup is not confirmed yet
+    embedded=Embedded(JsonLd(), clean=clean_name),
+)
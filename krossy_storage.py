@@ -0,0 +1,180 @@
+import logging
+import sqlite3
+import threading
+from typing import Iterable, List, Sequence, Tuple
+
+import pandas as pd
+
+from krossy_metrics import metrics
+
+
+logger = logging.getLogger()
+
+
+PRAGMAS = '''
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -65536;
+    PRAGMA mmap_size = 268435456;
+'''
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS products (
+        link TEXT PRIMARY KEY,
+        name TEXT,
+        price_ua INTEGER,
+        price_us REAL,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS price_history (
+        id INTEGER PRIMARY KEY,
+        link TEXT NOT NULL,
+        price_ua INTEGER,
+        price_us REAL,
+        date TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS products_price_ua ON products(price_ua);
+    CREATE INDEX IF NOT EXISTS price_history_link_date ON price_history(link, date);
+    CREATE INDEX IF NOT EXISTS price_history_date ON price_history(date);
+    CREATE INDEX IF NOT EXISTS price_history_price_ua ON price_history(price_ua);
+    CREATE TABLE IF NOT EXISTS price_changes (
+        id INTEGER PRIMARY KEY,
+        link TEXT NOT NULL,
+        old_price_ua INTEGER,
+        price_ua INTEGER,
+        date TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS price_changes_date ON price_changes(date);
+'''
+
+UPSERT_PRODUCT = '''
+    INSERT INTO products (link, name, price_ua, price_us, first_seen, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(link) DO UPDATE SET
+        name = excluded.name,
+        price_ua = excluded.price_ua,
+        price_us = excluded.price_us,
+        last_seen = excluded.last_seen
+'''
+
+# Rows of a pre-schema krossy_table, oldest first: the newest values win and
+# first_seen/last_seen widen, without overwriting fresher data already in products.
+MIGRATE_PRODUCTS = '''
+    INSERT INTO products (link, name, price_ua, price_us, first_seen, last_seen)
+    SELECT link, name, price_ua, {price_us}, date, date FROM {legacy} WHERE link IS NOT NULL ORDER BY date
+    ON CONFLICT(link) DO UPDATE SET
+        name = CASE WHEN excluded.last_seen >= products.last_seen THEN excluded.name ELSE products.name END,
+        price_ua = CASE WHEN excluded.last_seen >= products.last_seen THEN excluded.price_ua ELSE products.price_ua END,
+        price_us = CASE WHEN excluded.last_seen >= products.last_seen THEN excluded.price_us ELSE products.price_us END,
+        first_seen = MIN(products.first_seen, excluded.first_seen),
+        last_seen = MAX(products.last_seen, excluded.last_seen)
+'''
+
+MIGRATE_HISTORY = '''
+    INSERT INTO price_history (link, price_ua, price_us, date)
+    SELECT link, price_ua, {price_us}, date FROM {legacy} WHERE link IS NOT NULL ORDER BY date
+'''
+
+INSERT_HISTORY = 'INSERT INTO price_history (link, price_ua, price_us, date) VALUES (?, ?, ?, ?)'
+
+INSERT_CHANGE = 'INSERT INTO price_changes (link, old_price_ua, price_ua, date) VALUES (?, ?, ?, ?)'
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# (link, name, price_ua, price_us, date)
+Record = Tuple[str, str, int, float, str]
+
+
+class StorageError(Exception):
+    pass
+
+
+class Storage:
+    # Typed schema shared by krossy.py, krossy_prefect.py and the Scrapy pipeline:
+    # current state per product link plus an append-only price history.
+    # `view` keeps the old flat krossy_table queries working on new databases.
+    def __init__(self, db: str, view: str = 'krossy_table') -> None:
+        self.db = db
+        self._lock = threading.Lock()
+        self.con = sqlite3.connect(self.db, check_same_thread=False)
+        self.con.executescript(PRAGMAS + SCHEMA)
+        self._migrate_legacy_table(view)
+        self.con.execute(
+            f'CREATE VIEW IF NOT EXISTS {view} AS '
+            'SELECT h.date, p.name, h.price_ua, h.link, h.price_us '
+            'FROM price_history h JOIN products p ON p.link = h.link'
+        )
+
+
+    def _migrate_legacy_table(self, view: str):
+        # Databases from before the typed schema have `view` as the flat table
+        # pandas.to_sql appended to; CREATE VIEW IF NOT EXISTS would silently keep
+        # it. Its rows move into products/price_history and the table is renamed
+        # to <view>_legacy, so the view can take its name.
+        found = self.con.execute('SELECT type FROM sqlite_master WHERE name = ?', (view,)).fetchone()
+        if found is None or found[0] == 'view':
+            return
+        legacy = f'{view}_legacy'
+        columns = {row[1] for row in self.con.execute(f'PRAGMA table_info({view})')}
+        missing = {'link', 'name', 'price_ua', 'date'} - columns
+        if found[0] != 'table' or missing:
+            raise StorageError(f'{self.db}: {view} is a {found[0]} that cannot be migrated (missing {sorted(missing)}); rename or drop it')
+        if self.con.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (legacy,)).fetchone():
+            raise StorageError(f'{self.db}: cannot migrate {view}, {legacy} already exists')
+        price_us = 'price_us' if 'price_us' in columns else 'NULL'
+        with self._lock, self.con:
+            self.con.execute(f'ALTER TABLE {view} RENAME TO {legacy}')
+            self.con.execute(MIGRATE_PRODUCTS.format(legacy=legacy, price_us=price_us))
+            count = self.con.execute(MIGRATE_HISTORY.format(legacy=legacy, price_us=price_us)).rowcount
+        logger.info(f'{self.db}: migrated {count} rows of the {view} table into products/price_history, kept as {legacy}')
+
+
+    def write_records(self, records: Sequence[Record]) -> int:
+        records = [record for record in records if record[0] is not None]
+        if not records:
+            return 0
+        with metrics.timer('db_write'), self._lock, self.con:
+            self.con.executemany(
+                UPSERT_PRODUCT,
+                ((link, name, price_ua, price_us, date, date) for link, name, price_ua, price_us, date in records),
+            )
+            self.con.executemany(
+                INSERT_HISTORY,
+                ((link, price_ua, price_us, date) for link, _, price_ua, price_us, date in records),
+            )
+        metrics.incr('db_rows', len(records))
+        return len(records)
+
+
+    def write_df(self, df: pd.DataFrame) -> int:
+        if not len(df):
+            return 0
+        dates = pd.to_datetime(df['date']).dt.strftime(DATE_FORMAT)
+        columns = [_to_list(df[col]) for col in ('link', 'name', 'price_ua', 'price_us')]
+        return self.write_records(list(zip(*columns, dates.tolist())))
+
+
+    def write_changes(self, changes: Sequence[Tuple[str, int, int, str]]) -> int:
+        # (link, old_price_ua, price_ua, date)
+        self.executemany(INSERT_CHANGE, changes)
+        return len(changes)
+
+
+    def executemany(self, sql: str, rows: Iterable[tuple]):
+        with self._lock, self.con:
+            self.con.executemany(sql, rows)
+
+
+    def query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._lock:
+            return self.con.execute(sql, tuple(params)).fetchall()
+
+
+    def close(self):
+        self.con.close()
+
+
+def _to_list(series: pd.Series) -> list:
+    return [None if pd.isna(value) else value for value in series.astype(object)]
@@ -0,0 +1,119 @@
+import pytest
+
+import krossy
+from krossy import ClientWeb, ExtractBootsMaleItems, Pages
+from krossy_fetch import FetchError
+
+
+URL = 'https://example.test/catalog/'
+
+
+def numbers(pages: Pages) -> list:
+    return [int(url.rstrip('/').rpartition('-')[2]) for url in pages]
+
+
+def test_pages_known_count():
+    assert numbers(Pages(URL, 5)) == [1, 2, 3, 4, 5]
+
+
+def test_pages_first_page_is_not_repeated():
+    pages = Pages(URL, 3, first=(URL + 'page-1/', b'<html>'))
+    assert numbers(pages) == [2, 3]
+    assert pages.numbers[URL + 'page-1/'] == 1
+
+
+def test_mark_empty_ends_catalog_after_consecutive_empty_pages():
+    pages = Pages(URL, 10, max_empty=2)
+    urls = iter(pages)
+    seen = [next(urls) for _ in range(5)]
+    pages.mark_empty(seen[3])
+    assert pages.end == 10
+    pages.mark_empty(seen[4])
+    assert pages.end == 3
+    assert list(urls) == []
+
+
+def test_mark_empty_ignores_gaps_and_unknown_urls():
+    pages = Pages(URL, 10, max_empty=2)
+    seen = list(pages)
+    pages.mark_empty(seen[1])
+    pages.mark_empty(seen[3])
+    pages.mark_empty('https://example.test/elsewhere/')
+    assert pages.end == 10
+
+
+def test_mark_empty_keeps_the_earliest_end():
+    pages = Pages(URL, None, max_empty=2)
+    urls = iter(pages)
+    seen = [next(urls) for _ in range(8)]
+    pages.mark_empty(seen[6])
+    pages.mark_empty(seen[7])
+    assert pages.end == 6
+    pages.mark_empty(seen[2])
+    pages.mark_empty(seen[3])
+    assert pages.end == 2
+    pages.mark_empty(seen[4])
+    assert pages.end == 2
+
+
+def test_mark_failed_ends_catalog_after_consecutive_failures():
+    pages = Pages(URL, None, max_failed=3)
+    urls = iter(pages)
+    seen = [next(urls) for _ in range(3)]
+    pages.mark_failed(seen[0])
+    pages.mark_failed(seen[1])
+    assert pages.end is None
+    pages.mark_failed(seen[2])
+    assert pages.end == 0
+    assert list(urls) == []
+
+
+def test_unknown_count_is_capped():
+    assert numbers(Pages(URL, None, max_pages=7)) == list(range(1, 8))
+
+
+@pytest.fixture
+def client():
+    client = ClientWeb(concurrency=4)
+    yield client
+    client.close()
+
+
+def test_unknown_count_stops_when_every_page_fails(client):
+    # the site answers 503 to everything: page 1 gives no count and no page ever comes back
+    requested = []
+
+    async def fail(url):
+        requested.append(url)
+        raise FetchError(url, 503)
+
+    client.engine.fetch_bytes = fail
+    extractor = ExtractBootsMaleItems(client=client, host='https://example.test', path='/catalog/')
+    assert list(extractor.iter_rows()) == []
+    # page 1 for the count, then the probe window and one more url per failure
+    # before the run is complete; failures are handled in page order
+    assert len(requested) == 1 + krossy.PROBE_WINDOW + krossy.FAILED_PAGES_STOP - 1
+    assert len(extractor.failed_urls) == len(requested) - 1
+
+
+def test_not_found_pages_end_an_unknown_catalog(client):
+    async def not_found(url):
+        raise FetchError(url, 404)
+
+    client.engine.fetch_bytes = not_found
+    extractor = ExtractBootsMaleItems(client=client, host='https://example.test', path='/catalog/')
+    assert list(extractor.iter_rows()) == []
+    assert extractor.failed_urls == []
+
+
+def test_failed_pages_are_counted_per_run(client):
+    async def fetch(url):
+        raise FetchError(url, 503 if '/failing/' in url else 404)
+
+    client.engine.fetch_bytes = fetch
+    failing = ExtractBootsMaleItems(client=client, host='https://example.test', path='/failing/')
+    other = ExtractBootsMaleItems(client=client, host='https://example.test', path='/catalog/')
+    assert list(failing.iter_rows()) == []
+    assert list(other.iter_rows()) == []
+    assert failing.failed_urls
+    assert other.failed_urls == []